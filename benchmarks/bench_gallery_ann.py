@@ -0,0 +1,98 @@
+"""
+Бенчмарк поиска по галерее лиц: полный перебор против IVF-индекса.
+
+Генерирует синтетические 128-мерные эталоны (как у dlib), запросы -
+зашумленные копии случайных эталонов (тот же человек в другом кадре).
+Для каждого размера галереи и каждого n_probe печатает:
+    recall@1 - доля запросов, где IVF нашел тот же эталон, что и перебор;
+    p50/p99  - задержка одного запроса (одно лицо в кадре), мс;
+    build    - время построения индекса, мс.
+
+Запуск (из корня проекта):
+    python benchmarks/bench_gallery_ann.py
+    python benchmarks/bench_gallery_ann.py --sizes 1000 10000 --nprobe 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blue_team.core.gallery import FaceGallery, EMBEDDING_DIM
+from blue_team.core.ann import IVFIndex
+
+
+def make_gallery(n, rng):
+    """Эталоны: случайные направления с нормой ~0.6 (разные люди на расстоянии ~0.85)."""
+    emb = rng.normal(size=(n, EMBEDDING_DIM)).astype(np.float32)
+    emb *= 0.6 / np.linalg.norm(emb, axis=1, keepdims=True)
+    return emb
+
+
+def make_queries(gallery, count, noise, rng):
+    """Запросы: эталон + шум (расстояние до "своего" эталона ~ noise)."""
+    idx = rng.integers(0, len(gallery), count)
+    jitter = rng.normal(size=(count, EMBEDDING_DIM)).astype(np.float32)
+    jitter *= noise / np.sqrt(EMBEDDING_DIM)
+    return gallery[idx] + jitter
+
+
+def time_queries(fn, queries):
+    timings = []
+    results = []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(q[None, :]))
+        timings.append((time.perf_counter() - t0) * 1000.0)
+    timings = np.asarray(timings)
+    return results, np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def run(sizes, nprobes, n_queries, noise, seed):
+    rng = np.random.default_rng(seed)
+    print(f"{'N':>8} {'mode':>12} {'recall@1':>9} {'p50 ms':>8} {'p99 ms':>8} {'build ms':>9}")
+
+    for n in sizes:
+        emb = make_gallery(n, rng)
+        queries = make_queries(emb, n_queries, noise, rng)
+        gallery = FaceGallery(np.arange(n), [""] * n, [""] * n, emb)
+
+        def exact(q):
+            return int(np.argmin(gallery._squared_distances(q)[0]))
+
+        truth, p50, p99 = time_queries(exact, queries)
+        print(f"{n:>8} {'exact':>12} {1.0:>9.3f} {p50:>8.3f} {p99:>8.3f} {0.0:>9.1f}")
+
+        t0 = time.perf_counter()
+        n_lists = int(round(np.sqrt(n)))
+        base = IVFIndex.train(emb, n_lists)
+        build_ms = (time.perf_counter() - t0) * 1000.0
+
+        for n_probe in nprobes:
+            base.n_probe = max(1, min(n_probe, base.n_lists))
+
+            def ivf(q):
+                return int(base.search(q)[0][0])
+
+            found, p50, p99 = time_queries(ivf, queries)
+            recall = np.mean(np.asarray(found) == np.asarray(truth))
+            label = f"ivf/{base.n_probe}"
+            print(f"{n:>8} {label:>12} {recall:>9.3f} {p50:>8.3f} {p99:>8.3f} {build_ms:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.35, help="расстояние запроса до своего эталона")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.sizes, args.nprobe, args.queries, args.noise, args.seed)
+
+
+if __name__ == "__main__":
+    main()
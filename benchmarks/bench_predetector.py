@@ -0,0 +1,117 @@
+"""
+Бенчмарк каскадного пред-детектора: HOG на всем кадре против каскад + HOG.
+
+Работает на записанных кадрах (видеофайл или папка с изображениями).
+Эталон - результат чистого HOG на том же кадре, поэтому разметка не нужна.
+Печатает:
+    recall (кадры) - доля кадров с лицом (по HOG), где каскад + HOG тоже нашел лицо;
+    recall (лица)  - доля лиц HOG, найденных каскадом + HOG (IoU >= 0.5);
+    отсев          - доля кадров, отброшенных каскадом без запуска HOG;
+    p50/p99/mean   - задержка детекции одного кадра, мс.
+
+Запуск (из корня проекта):
+    python benchmarks/bench_predetector.py --source video:data/record.mp4
+    python benchmarks/bench_predetector.py --source images:data/frames --min-neighbors 2 3 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blue_team.config import (
+    FRAME_SCALING, PREDETECT_CASCADE, PREDETECT_WIDTH, PREDETECT_MIN_NEIGHBORS, PREDETECT_PADDING
+)
+from blue_team.core.detection import CascadePreDetector
+from blue_team.core.sources import create_frame_source
+
+
+def load_frames(spec, limit, scaling):
+    """Уменьшенные RGB-кадры источника (как их готовит FrameGrabber)."""
+    source = create_frame_source(spec)
+    source.realtime = False
+    if not source.open():
+        raise SystemExit(f"Не удалось открыть источник: {spec}")
+    frames = []
+    try:
+        while not limit or len(frames) < limit:
+            ret, frame = source.read()
+            if not ret: break
+            small = cv2.resize(frame, (0, 0), fx=scaling, fy=scaling)
+            frames.append(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+    finally:
+        source.release()
+    return frames
+
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda r: (r[2] - r[0]) * (r[1] - r[3])
+    union = area(a) + area(b) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def timed(fn, frames):
+    results, times = [], []
+    for rgb in frames:
+        t0 = time.perf_counter()
+        results.append(fn(rgb))
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return results, np.array(times)
+
+
+def fmt_times(times):
+    return f"p50 {np.percentile(times, 50):7.2f}  p99 {np.percentile(times, 99):7.2f}  mean {times.mean():7.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', required=True, help="video:<путь> или images:<папка> (см. create_frame_source)")
+    parser.add_argument('--frames', type=int, default=0, help="максимум кадров (0 - все)")
+    parser.add_argument('--scaling', type=float, default=FRAME_SCALING)
+    parser.add_argument('--cascade', default=PREDETECT_CASCADE)
+    parser.add_argument('--width', type=int, default=PREDETECT_WIDTH)
+    parser.add_argument('--padding', type=float, default=PREDETECT_PADDING)
+    parser.add_argument('--min-neighbors', type=int, nargs='+', default=[PREDETECT_MIN_NEIGHBORS])
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames, args.scaling)
+    if not frames:
+        raise SystemExit("Источник не дал ни одного кадра.")
+
+    baseline, base_times = timed(face_recognition.face_locations, frames)
+    positive = [i for i, locs in enumerate(baseline) if locs]
+    total_faces = sum(len(locs) for locs in baseline)
+
+    print(f"Кадров: {len(frames)}  с лицом (HOG): {len(positive)}  лиц: {total_faces}")
+    print(f"{'HOG (весь кадр)':<24} {fmt_times(base_times)} мс")
+
+    for neighbors in args.min_neighbors:
+        pre = CascadePreDetector(args.cascade, args.width, neighbors, args.padding)
+        cascaded, times = timed(pre.locate, frames)
+
+        frame_hits = sum(1 for i in positive if cascaded[i])
+        face_hits = sum(
+            1
+            for locs, found in zip(baseline, cascaded)
+            for loc in locs
+            if any(iou(loc, f) >= 0.5 for f in found)
+        )
+        frame_recall = frame_hits / len(positive) if positive else 1.0
+        face_recall = face_hits / total_faces if total_faces else 1.0
+        reject_rate = pre.stats['rejected'] / len(frames)
+
+        print(f"{'каскад + HOG, mn=' + str(neighbors):<24} {fmt_times(times)} мс  "
+              f"x{base_times.mean() / max(times.mean(), 1e-9):.2f}  "
+              f"recall кадры {frame_recall:.3f}  лица {face_recall:.3f}  отсев {reject_rate:.1%}")
+
+
+if __name__ == '__main__':
+    main()
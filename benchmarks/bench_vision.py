@@ -0,0 +1,261 @@
+"""
+Офлайн-бенчмарк конвейера распознавания VisionSystem.
+
+Прогоняет записанные (или сгенерированные) кадры через те же этапы, что и
+сервис: уменьшение кадра, детекция (locate_faces), кодирование
+(face_encodings), сравнение с галереей (FaceGallery.match) и анализ
+живости (LivenessAnalyzer: resize/glare/skin/texture) - для каждой
+комбинации разрешения кадра, FRAME_SCALING и размера галереи.
+
+Результат - JSON: кадры/сек, время этапов (mean/p50/p95/p99 по
+гистограммам core.metrics) и пиковая память (tracemalloc).
+Камера и GUI не нужны - работает на headless Linux.
+
+Запуск (из корня проекта):
+    python benchmarks/bench_vision.py --source video:data/record.mp4 --out base.json
+    python benchmarks/bench_vision.py --source images:data/frames \\
+        --resolutions 640x480 1280x720 --scalings 0.25 0.5 --gallery-sizes 100 10000 --out new.json
+    python benchmarks/bench_vision.py --source synthetic:data/face.jpg --frames 100
+
+Сравнение двух прогонов (код возврата 1 при регрессии):
+    python benchmarks/bench_vision.py --compare base.json new.json --threshold 0.1
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import face_recognition
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blue_team.config import FRAME_SCALING, FACE_TOLERANCE
+from blue_team.core.detection import locate_faces
+from blue_team.core.gallery import FaceGallery, EMBEDDING_DIM
+from blue_team.core.liveness import LivenessAnalyzer
+from blue_team.core.metrics import METRICS
+from blue_team.core.sources import create_frame_source
+
+# Отступ вокруг лица при вырезании кропа для живости (как в VisionSystem._score_face)
+FACE_PAD = 20
+
+
+def load_frames(spec, limit):
+    """Кадры источника в исходном разрешении (BGR)."""
+    source = create_frame_source(spec)
+    source.realtime = False
+    if hasattr(source, 'count') and not source.count:
+        source.count = limit  # Генератор бесконечен
+    if not source.open():
+        raise SystemExit(f"Не удалось открыть источник: {spec}")
+    frames = []
+    try:
+        while len(frames) < limit:
+            ret, frame = source.read()
+            if not ret: break
+            frames.append(frame)
+    finally:
+        source.release()
+    return frames
+
+
+def parse_resolution(text):
+    w, _, h = text.lower().partition('x')
+    return int(w), int(h)
+
+
+def make_gallery(size, known, rng):
+    """
+    Галерея заданного размера: найденные в корпусе лица (чтобы сравнение
+    давало совпадения) + синтетические эталоны до нужного размера.
+    """
+    known = np.asarray(known, dtype=np.float32).reshape(-1, EMBEDDING_DIM)[:size]
+    extra = rng.normal(size=(size - len(known), EMBEDDING_DIM)).astype(np.float32)
+    extra *= 0.6 / np.linalg.norm(extra, axis=1, keepdims=True)
+    matrix = np.vstack([known, extra])
+    ids = np.arange(1, size + 1)
+    return FaceGallery(ids, [f"user{i}" for i in ids], ["bench"] * size, matrix).build_index()
+
+
+def collect_known_encodings(frames, scaling, limit=16):
+    """Эталоны лиц из самого корпуса (первые limit найденных лиц)."""
+    encs = []
+    for bgr in frames:
+        small = cv2.resize(bgr, (0, 0), fx=scaling, fy=scaling)
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        locs = face_recognition.face_locations(rgb)
+        if locs:
+            encs.extend(face_recognition.face_encodings(rgb, locs))
+        if len(encs) >= limit: break
+    return encs[:limit]
+
+
+def face_crop(bgr, loc, scaling):
+    top, right, bottom, left = loc
+    factor = 1.0 / scaling
+    h, w = bgr.shape[:2]
+    y1, y2 = max(0, int(top * factor) - FACE_PAD), min(h, int(bottom * factor) + FACE_PAD)
+    x1, x2 = max(0, int(left * factor) - FACE_PAD), min(w, int(right * factor) + FACE_PAD)
+    return bgr[y1:y2, x1:x2]
+
+
+def run_case(frames, scaling, gallery, analyzer, track_memory):
+    """Один прогон корпуса. Этапы пишутся в общий реестр METRICS."""
+    METRICS.reset()
+    if track_memory:
+        tracemalloc.reset_peak()
+        mem_base = tracemalloc.get_traced_memory()[0]
+
+    faces = matched = live = 0
+    t0 = time.perf_counter()
+    for bgr in frames:
+        with METRICS.span('frame'):
+            with METRICS.span('resize'):
+                small = cv2.resize(bgr, (0, 0), fx=scaling, fy=scaling)
+                rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            with METRICS.span('detect'):
+                locs = locate_faces(rgb)
+            if not locs:
+                continue
+            faces += len(locs)
+            with METRICS.span('encode'):
+                encs = face_recognition.face_encodings(rgb, locs)
+            with METRICS.span('match'):
+                matches = gallery.match(encs, FACE_TOLERANCE)
+            matched += sum(1 for m in matches if m is not None)
+            for loc in locs:
+                crop = face_crop(bgr, loc, scaling)
+                if crop.size == 0: continue
+                live += int(analyzer.analyze(crop).is_live)
+    wall = time.perf_counter() - t0
+
+    stages = {
+        name: {k: h[k] for k in ('count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')}
+        for name, h in METRICS.snapshot()['stages'].items()
+    }
+    result = {
+        'frames': len(frames),
+        'faces': faces,
+        'matched': matched,
+        'live': live,
+        'wall_sec': round(wall, 3),
+        'fps': round(len(frames) / wall, 2) if wall > 0 else 0.0,
+        'stages': stages,
+    }
+    if track_memory:
+        result['peak_mem_mb'] = round((tracemalloc.get_traced_memory()[1] - mem_base) / 2**20, 2)
+    return result
+
+
+def case_key(case):
+    return f"{case['resolution']}@{case['scaling']}/g{case['gallery_size']}"
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    corpus = load_frames(args.source, args.frames)
+    if not corpus:
+        raise SystemExit("Источник не дал ни одного кадра.")
+
+    resolutions = args.resolutions or ["{}x{}".format(corpus[0].shape[1], corpus[0].shape[0])]
+    analyzer = LivenessAnalyzer()
+    if not args.no_memory:
+        tracemalloc.start()
+
+    cases = []
+    for res in resolutions:
+        size = parse_resolution(res)
+        frames = [f if f.shape[1::-1] == size else cv2.resize(f, size, interpolation=cv2.INTER_AREA) for f in corpus]
+        for scaling in args.scalings:
+            known = collect_known_encodings(frames, scaling)
+            for gallery_size in args.gallery_sizes:
+                gallery = make_gallery(max(gallery_size, len(known)), known, rng)
+                case = {'resolution': res, 'scaling': scaling, 'gallery_size': len(gallery)}
+                case.update(run_case(frames, scaling, gallery, analyzer, not args.no_memory))
+                cases.append(case)
+                print(f"{case_key(case):<28} {case['fps']:8.2f} fps  лиц {case['faces']:5d}  "
+                      f"опознано {case['matched']:5d}  живых {case['live']:5d}"
+                      + (f"  пик {case['peak_mem_mb']:.1f} МБ" if 'peak_mem_mb' in case else ""))
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'source': args.source,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'face_tolerance': FACE_TOLERANCE,
+        },
+        'cases': cases,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"Результат: {args.out}")
+    else:
+        print(text)
+
+
+def compare(base_path, new_path, threshold, min_ms):
+    """
+    Сравнивает два отчета. Регрессия - падение fps или рост среднего
+    времени этапа больше чем на threshold (и больше min_ms в абсолюте).
+    """
+    with open(base_path, encoding='utf-8') as f:
+        base = {case_key(c): c for c in json.load(f)['cases']}
+    with open(new_path, encoding='utf-8') as f:
+        new = {case_key(c): c for c in json.load(f)['cases']}
+
+    regressions = 0
+    for key in sorted(set(base) & set(new)):
+        b, n = base[key], new[key]
+        rows = [('fps', b['fps'], n['fps'], n['fps'] < b['fps'] * (1 - threshold))]
+        for stage in sorted(set(b['stages']) & set(n['stages'])):
+            bm, nm = b['stages'][stage]['mean_ms'], n['stages'][stage]['mean_ms']
+            rows.append((stage, bm, nm, nm > bm * (1 + threshold) and nm - bm > min_ms))
+        if 'peak_mem_mb' in b and 'peak_mem_mb' in n:
+            rows.append(('peak_mem_mb', b['peak_mem_mb'], n['peak_mem_mb'],
+                         n['peak_mem_mb'] > b['peak_mem_mb'] * (1 + threshold)))
+
+        print(key)
+        for name, bv, nv, bad in rows:
+            change = (nv - bv) / bv if bv else 0.0
+            regressions += int(bad)
+            print(f"  {name:<18} {bv:10.3f} -> {nv:10.3f}  {change:+7.1%}{'  РЕГРЕССИЯ' if bad else ''}")
+
+    for key in sorted(set(base) ^ set(new)):
+        print(f"{key}: есть только в {'base' if key in base else 'new'}")
+    print(f"Регрессий: {regressions}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default="synthetic",
+                        help="video:<путь>, images:<папка> или synthetic[:<фото лица>]")
+    parser.add_argument('--frames', type=int, default=200, help="максимум кадров корпуса")
+    parser.add_argument('--resolutions', nargs='+', help="разрешения кадра, например 640x480 1280x720")
+    parser.add_argument('--scalings', type=float, nargs='+', default=[FRAME_SCALING])
+    parser.add_argument('--gallery-sizes', type=int, nargs='+', default=[100, 10000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true', help="не замерять память (tracemalloc замедляет Python-код)")
+    parser.add_argument('--out', help="файл для JSON-отчета (по умолчанию - stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="сравнить два отчета")
+    parser.add_argument('--threshold', type=float, default=0.10, help="допустимое ухудшение (доля)")
+    parser.add_argument('--min-ms', type=float, default=0.05, help="игнорировать рост этапа меньше N мс")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold, args.min_ms))
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,9 @@ KEY_VAULT_PATH = DATA_DIR / "master.key"
 # Сервис создает его, клиенты (Конфигуратор, Вьювер) читают
 TOKEN_PATH = DATA_DIR / "ipc_session.token"
 
+# Файл, в который сервис сохраняет метрики задержек при остановке
+METRICS_DUMP_PATH = DATA_DIR / "metrics.json"
+
 # =============================================================================
 # НАСТРОЙКИ БЕЗОПАСНОСТИ
 # =============================================================================
@@ -31,9 +34,64 @@ TOKEN_PATH = DATA_DIR / "ipc_session.token"
 # 0.5 = 2 раза в секунду. Оптимально для баланса нагрузка/реакция.
 FACE_CHECK_INTERVAL = 0.2
 
+# Индекс процессов для поиска приложений из черного списка: имена
+# определяются только для новых PID, полная перепроверка всех имен
+# (на случай повторного использования PID системой) - раз в N секунд
+PROCESS_RESYNC_INTERVAL = 30
+
+# Наблюдение за запуском и завершением процессов из черного списка:
+# "auto"    - WMI (Win32_ProcessStartTrace) в Windows, netlink proc connector
+#             в Linux (нужны права root), иначе опрос
+# "wmi", "netlink" - конкретный механизм событий
+# "polling" - опрос списка процессов каждые PROCESS_POLL_INTERVAL секунд
+# В покое цикл защиты спит до события, а не просыпается каждый такт.
+PROCESS_WATCHER = "auto"
+
+# Интервал опроса списка процессов для "polling" (сек)
+PROCESS_POLL_INTERVAL = 0.2
+
+# Максимальный сон цикла защиты в покое без событий (сек):
+# таймаут резерва камеры и прочие проверки по времени
+PROCESS_IDLE_TIMEOUT = 5.0
+
+# Повтор неудавшейся блокировки/разблокировки процесса: задержка
+# удваивается с каждой попыткой от BASE до MAX секунд
+ENFORCE_RETRY_BASE = 0.5
+ENFORCE_RETRY_MAX = 10.0
+
 # Индекс камеры (0 - первая камера в системе)
 CAMERA_INDEX = 1
 
+# Бэкенд захвата камеры OpenCV (DSHOW, MSMF, V4L2, ANY)
+CAMERA_BACKEND = "DSHOW"
+
+# Источник кадров для VisionSystem:
+# "camera"         - камера CAMERA_INDEX (боевой режим)
+# "video:<путь>"   - видеофайл
+# "images:<путь>"  - папка с кадрами (jpg/png/bmp)
+# "synthetic"      - синтетический генератор ("synthetic:<фото лица>")
+# Файлы и генератор позволяют профилировать распознавание без веб-камеры.
+FRAME_SOURCE = "camera"
+
+# Несколько камер (например, по камере на монитор или ракурсы киоска):
+# список источников в формате FRAME_SOURCE, например ["camera:0", "camera:1"].
+# Первый источник - основной. Пустой список - одна камера FRAME_SOURCE.
+FRAME_SOURCES = []
+
+# Объединение результатов камер в global_auth_status:
+# "any"              - достаточно опознания на любой камере
+# "all"              - лицо должно быть опознано на всех камерах
+# "primary_fallback" - решает основная камера; остальные - только
+#                      пока основная не дает кадров
+CAMERA_FUSION = "any"
+
+# Воспроизведение файлов/папок/генератора: True - в реальном времени,
+# False - так быстро, как успевает обработка
+FRAME_SOURCE_REALTIME = True
+
+# Частота кадров для папок с изображениями и генератора
+FRAME_SOURCE_FPS = 15
+
 # Строгость сравнения лиц (0.0 - строго, 1.0 - всех пускать)
 # 0.6 - рекомендованный стандарт dlib
 FACE_TOLERANCE = 0.6
@@ -42,6 +100,171 @@ FACE_TOLERANCE = 0.6
 # 0.25 = уменьшить в 4 раза (быстрее в 16 раз)
 FRAME_SCALING = 0.25
 
+# Индекс галереи лиц:
+# "exact" - полный перебор всех эталонов (точно, время растет линейно)
+# "ivf"   - приближенный поиск: k-means кластеры + инвертированные списки
+GALLERY_INDEX = "exact"
+
+# Минимальный размер галереи, с которого включается ANN-индекс.
+# На меньших галереях полный перебор быстрее построения индекса.
+ANN_MIN_GALLERY_SIZE = 20000
+
+# Число кластеров IVF (0 = автоматически, ~sqrt(N))
+ANN_NLIST = 0
+
+# Сколько ближайших кластеров просматривать при поиске.
+# Ручка точность/скорость: больше -> выше recall, но медленнее.
+ANN_NPROBE = 16
+
+# Фоновый захват кадров: размер кольцевого буфера (кадров)
+FRAME_BUFFER_SIZE = 3
+
+# Кадры старше этого возраста (сек) считаются устаревшими и отбрасываются
+FRAME_MAX_AGE = 0.5
+
+# Сколько ждать свежий кадр (сек). Нужно только при холодном старте камеры
+# (открытие через DirectShow может занимать около секунды).
+FRAME_WAIT_TIMEOUT = 1.5
+
+# Прогрев при старте сервиса: процессы пула проверки живости, модели dlib
+# и холостой прогон детекции/кодирования выполняются до первой проверки,
+# а не в момент, когда сотрудник ждет доступа.
+WARMUP_ENABLED = True
+
+# "Теплый резерв" камеры: в покое камера не закрывается, а читается
+# с низкой частотой - при активации не нужно заново открывать устройство.
+# Пока камера в резерве, ее индикатор остается включенным.
+CAMERA_STANDBY = False
+
+# Частота чтения кадров в резерве (кадров/сек)
+CAMERA_STANDBY_FPS = 2
+
+# Через сколько секунд покоя закрыть камеру в резерве (0 - не закрывать)
+CAMERA_STANDBY_TIMEOUT = 300
+
+# Конвейерная проверка живости (check_liveness_and_auth):
+# число процессов детекции/кодирования. Пока кадр N проходит анализ живости,
+# кадр N+1 уже детектируется. 0 = авто (ядра - 1, не более 4), 1 = без процессов.
+LIVENESS_WORKERS = 0
+
+# Начальный размер (ширина, высота) буферов анализа живости. Кроп лица
+# анализируется в исходном разрешении; буферы растут только под кроп большей площади.
+LIVENESS_CROP_SIZE = (192, 192)
+
+# Режим решения о живости:
+# "fixed"      - до 5 кадров, доступ по первому чистому кадру
+# "sequential" - последовательный тест (SPRT): оценки кадров накапливаются,
+#                решение принимается, как только набрана уверенность
+LIVENESS_MODE = "fixed"
+
+# Требуемая уверенность решения в режиме "sequential" (0.5..1)
+LIVENESS_CONFIDENCE = 0.99
+
+# Границы числа кадров в режиме "sequential":
+# не решать раньше MIN кадров с лицом, не смотреть больше MAX кадров
+LIVENESS_MIN_FRAMES = 2
+LIVENESS_MAX_FRAMES = 10
+
+# Детекция лиц в check_authorization:
+# "full"     - весь кадр, уменьшенный в FRAME_SCALING раз
+# "adaptive" - область вокруг прошлого лица в масштабе, подобранном
+#              по размеру лица (полный кадр - периодически и при промахе)
+DETECTION_MODE = "full"
+
+# Запас вокруг прошлого лица для ROI (доля размера лица)
+ROI_PADDING = 0.6
+
+# Желаемый размер лица (px) на изображении, подаваемом в HOG.
+# HOG уверенно находит лица от ~40 px; 80 px - запас по точности.
+ROI_TARGET_FACE_SIZE = 80
+
+# Полный скан кадра не реже, чем раз в N кадров в режиме "adaptive"
+ROI_FULL_SCAN_EVERY = 15
+
+# Каскадный пред-детектор перед HOG (Haar/LBP из OpenCV).
+# Кадры без лицеподобных областей отбрасываются без HOG, а HOG запускается
+# только на области кандидатов. Каскад пропускает часть повернутых лиц -
+# перед включением сравните recall/задержку: benchmarks/bench_predetector.py
+# Работает только в быстром мониторинге (check_authorization): проверка
+# живости всегда ищет лица полным HOG, чтобы не пропустить чужого.
+PREDETECT_ENABLED = False
+
+# Файл каскада: имя из cv2.data.haarcascades или полный путь к XML (в т.ч. LBP)
+PREDETECT_CASCADE = "haarcascade_frontalface_default.xml"
+
+# Ширина серой миниатюры (px), на которой работает каскад
+PREDETECT_WIDTH = 160
+
+# minNeighbors каскада: меньше - выше recall, больше ложных кандидатов
+PREDETECT_MIN_NEIGHBORS = 3
+
+# Запас вокруг кандидата для HOG (доля размера кандидата)
+PREDETECT_PADDING = 0.5
+
+# Сопровождение лица между кадрами в check_authorization.
+# Пока авторизованное лицо на месте, вместо HOG-детекции используется
+# дешевая корреляция шаблона.
+# Выключено по умолчанию: сопровождение продлевает прошлое решение без
+# повторного опознания лица.
+TRACKING_ENABLED = False
+
+# Полная детекция и опознание не реже, чем раз в N кадров сопровождения
+# (10 кадров * FACE_CHECK_INTERVAL 0.2 = раз в 2 секунды)
+TRACK_REDETECT_EVERY = 10
+
+# Минимальная корреляция шаблона (0..1). Ниже - лицо считается потерянным.
+TRACK_MIN_CONFIDENCE = 0.6
+
+# Несколько эталонов на сотрудника (освещение, очки, ракурс).
+# Не больше N эталонов после отбора при регистрации
+TEMPLATE_MAX_PER_USER = 8
+
+# Снимки ближе этого расстояния к уже выбранному эталону - дубликаты
+TEMPLATE_MIN_DISTANCE = 0.15
+
+# Сколько лучших сотрудников (по центроидам) уточняется по их эталонам
+TEMPLATE_TOP_K = 3
+
+# Фильтр неизменной сцены: если кадр почти не отличается от кадра последнего
+# опознания, результат переиспользуется без детекции и кодирования.
+# Выключен по умолчанию: это повтор прошлого решения без повторного опознания.
+SCENE_GATE_ENABLED = False
+
+# Порог изменения сцены: средняя абсолютная разность яркости миниатюр (0..255)
+SCENE_CHANGE_THRESHOLD = 6.0
+
+# Максимальный возраст переиспользуемого результата (сек)
+SCENE_GATE_MAX_AGE = 2.0
+
+# Гистограммы задержек этапов распознавания (IPC GET_METRICS).
+# Замер - два вызова perf_counter и инкремент корзины на этап.
+METRICS_ENABLED = True
+
+# Фильтр качества кадра перед детекцией: темные, пересвеченные и смазанные
+# кадры пропускаются (берется следующий) и не считаются промахом.
+# Выключен по умолчанию: пока идет QUALITY_GRACE_PERIOD, закрытая или смазанная
+# камера не приближает блокировку - включайте осознанно.
+QUALITY_GATE_ENABLED = False
+
+# Яркость "темного" и "пересвеченного" пикселя (0..255)
+QUALITY_DARK_LEVEL = 30
+QUALITY_BRIGHT_LEVEL = 245
+
+# Максимальная доля темных / пересвеченных пикселей в кадре
+QUALITY_MAX_DARK_RATIO = 0.85
+QUALITY_MAX_BRIGHT_RATIO = 0.5
+
+# Минимальная резкость (дисперсия Лапласиана уменьшенного кадра).
+# Ниже - смаз от движения или расфокус.
+QUALITY_MIN_SHARPNESS = 20.0
+
+# Сколько плохих кадров подряд пропускать за одну проверку
+QUALITY_MAX_SKIPS = 3
+
+# Сколько секунд подряд плохие кадры не считаются промахом.
+# Дольше (например, камеру закрыли) - это отсутствие лица.
+QUALITY_GRACE_PERIOD = 3.0
+
 # Время жизни кэша состояния камеры (не используется в новой IPC архитектуре, но можно оставить)
 CAMERA_STATE_TTL = 2.0
 
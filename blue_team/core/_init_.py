@@ -6,17 +6,35 @@ Blue Team Core Package.
 2. DatabaseManager - управление базой данных и хранением настроек.
 3. VisionSystem - распознавание лиц и работа с камерой.
 4. SystemController - управление процессами и окнами Windows.
+5. FaceGallery - матрица эталонов лиц для пакетного сравнения.
+6. CameraGroup - несколько камер с объединением результатов.
+7. METRICS - гистограммы задержек этапов распознавания.
+8. ProcessIndex - инкрементальная таблица процессов (PID -> имя exe).
+9. EnforcementReconciler - применение блокировок только при смене состояния.
 """
 
 from .crypto import CryptoManager
 from .database import DatabaseManager
 from .vision import VisionSystem
 from .system import SystemController
+from .gallery import FaceGallery, FaceMatch
+from .multicam import CameraGroup, create_vision
+from .metrics import METRICS, MetricsRegistry
+from .processes import ProcessIndex
+from .enforcement import EnforcementReconciler
 
 # Список имен, экспортируемых при импорте через from blue_team.core import *
 __all__ = [
     'CryptoManager',
     'DatabaseManager',
     'VisionSystem',
-    'SystemController'
+    'SystemController',
+    'FaceGallery',
+    'FaceMatch',
+    'CameraGroup',
+    'create_vision',
+    'METRICS',
+    'MetricsRegistry',
+    'ProcessIndex',
+    'EnforcementReconciler'
 ]
@@ -0,0 +1,173 @@
+import numpy as np
+
+from ..config import GALLERY_INDEX, ANN_MIN_GALLERY_SIZE, ANN_NLIST, ANN_NPROBE
+
+
+class IVFIndex:
+    """
+    Приближенный поиск ближайшего соседа (IVF).
+
+    Грубый квантизатор k-means делит галерею на L кластеров (инвертированных
+    списков). При поиске лицо сравнивается только с эталонами из n_probe
+    ближайших кластеров, а не со всей галереей.
+
+    n_probe - ручка "точность/скорость": больше списков -> выше recall,
+    но больше сравнений. При n_probe == L поиск становится точным.
+
+    Эталоны переупорядочены по спискам и лежат непрерывно (packed), поэтому
+    каждый список - это срез матрицы без копирования.
+    """
+
+    def __init__(self, centroids, n_probe=ANN_NPROBE):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.c_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.n_probe = max(1, min(int(n_probe), len(self.centroids)))
+        # Размер галереи, на которой обучался квантизатор
+        self.trained_size = 0
+
+        self.order = None       # Индексы строк галереи, отсортированные по спискам
+        self.offsets = None     # Границы списков в order (L + 1)
+        self.packed = None      # Эталоны в порядке order
+        self.packed_sq = None   # Квадраты их норм
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    # =========================================================================
+    # ОБУЧЕНИЕ И НАПОЛНЕНИЕ
+    # =========================================================================
+
+    @classmethod
+    def train(cls, embeddings, n_lists, n_probe=ANN_NPROBE, iters=10, seed=0):
+        """Обучает квантизатор k-means на подвыборке и наполняет списки."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n = len(embeddings)
+        n_lists = max(1, min(int(n_lists), n))
+        rng = np.random.default_rng(seed)
+
+        # Для k-means достаточно ~64 точек на кластер
+        sample_size = min(n, n_lists * 64)
+        sample = embeddings[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+        for _ in range(iters):
+            labels = _nearest_centroids(sample, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+            # Пустые кластеры переинициализируем случайными точками
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+
+        index = cls(centroids, n_probe)
+        index.trained_size = n
+        index.assign(embeddings)
+        return index
+
+    def assign(self, embeddings):
+        """
+        Раскладывает эталоны по спискам с текущими центроидами.
+        Переобучения не требует: один проход матричного умножения.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        labels = _nearest_centroids(embeddings, self.centroids)
+        self.order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=self.n_lists)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.packed = np.ascontiguousarray(embeddings[self.order])
+        self.packed_sq = np.einsum('ij,ij->i', self.packed, self.packed)
+
+    def rebind(self, embeddings, n_probe=None):
+        """Новый индекс на новой галерее с центроидами этого индекса."""
+        index = IVFIndex(self.centroids, self.n_probe if n_probe is None else n_probe)
+        index.trained_size = self.trained_size
+        index.assign(embeddings)
+        return index
+
+    # =========================================================================
+    # ПОИСК
+    # =========================================================================
+
+    def probe_rows(self, query):
+        """
+        Индексы строк исходной матрицы из n_probe ближайших к лицу списков
+        (кандидаты для точной проверки вызывающим кодом).
+        """
+        cd = self.c_sq_norms - 2.0 * (self.centroids @ query)
+        if self.n_probe < self.n_lists:
+            probes = np.argpartition(cd, self.n_probe - 1)[:self.n_probe]
+        else:
+            probes = range(self.n_lists)
+        return np.concatenate([self.order[self.offsets[lst]:self.offsets[lst + 1]] for lst in probes])
+
+    def search(self, queries):
+        """
+        Ближайший эталон для каждого лица.
+
+        Returns:
+            tuple: (индексы строк исходной галереи, квадраты расстояний)
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+
+        cd = self.c_sq_norms[None, :] - 2.0 * (queries @ self.centroids.T)
+        if self.n_probe < self.n_lists:
+            probes = np.argpartition(cd, self.n_probe - 1, axis=1)[:, :self.n_probe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), cd.shape)
+
+        best_idx = np.zeros(len(queries), dtype=np.int64)
+        best_sq = np.full(len(queries), np.inf, dtype=np.float32)
+
+        for f, q in enumerate(queries):
+            for lst in probes[f]:
+                start, end = self.offsets[lst], self.offsets[lst + 1]
+                if start == end:
+                    continue
+                d = self.packed_sq[start:end] - 2.0 * (self.packed[start:end] @ q)
+                j = int(np.argmin(d))
+                if d[j] < best_sq[f]:
+                    best_sq[f] = d[j]
+                    best_idx[f] = self.order[start + j]
+
+            best_sq[f] = max(0.0, best_sq[f] + q_sq[f])
+
+        return best_idx, best_sq
+
+
+def _nearest_centroids(points, centroids, chunk=8192):
+    """Номер ближайшего центроида для каждой точки (по частям, чтобы не раздувать память)."""
+    c_sq = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), chunk):
+        block = points[start:start + chunk]
+        d = c_sq[None, :] - 2.0 * (block @ centroids.T)
+        labels[start:start + chunk] = np.argmin(d, axis=1)
+    return labels
+
+
+def create_index(embeddings, previous=None):
+    """
+    Создает ANN-индекс для галереи согласно config.py.
+
+    Возвращает None, если включен полный перебор или галерея слишком мала.
+    Если передан предыдущий индекс и размер галереи изменился не более чем
+    вдвое, центроиды переиспользуются (только раскладка по спискам),
+    иначе квантизатор обучается заново.
+    """
+    n = len(embeddings)
+    if GALLERY_INDEX != "ivf" or n < max(1, ANN_MIN_GALLERY_SIZE):
+        return None
+
+    if previous is not None and previous.trained_size:
+        ratio = n / previous.trained_size
+        if 0.5 <= ratio <= 2.0:
+            return previous.rebind(embeddings, ANN_NPROBE)
+
+    n_lists = ANN_NLIST or int(round(np.sqrt(n)))
+    return IVFIndex.train(embeddings, n_lists, ANN_NPROBE)
@@ -0,0 +1,224 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import cv2
+
+from ..config import FRAME_SCALING, FRAME_BUFFER_SIZE, FRAME_MAX_AGE
+from .metrics import METRICS
+from .sources import create_frame_source
+
+# Кадр из буфера:
+# seq - порядковый номер, ts - время захвата (time.monotonic),
+# bgr - полный кадр камеры, rgb_small - уменьшенная RGB-копия (FRAME_SCALING)
+Frame = namedtuple('Frame', ['seq', 'ts', 'bgr', 'rgb_small'])
+
+
+class FrameGrabber:
+    """
+    Фоновый захват кадров из источника (камера, файл, генератор).
+
+    Отдельный поток непрерывно читает источник в маленький кольцевой буфер
+    и сразу готовит уменьшенную RGB-копию для детекции. Цикл защиты
+    забирает "последний кадр" без ожидания cap.read(), а устаревшие кадры
+    (старше max_age) отбрасываются и не попадают в анализ.
+
+    Живой источник (камера) при сбое переоткрывается; конечный (файл)
+    по окончании останавливает поток и больше не перезапускается (ended).
+
+    Конечный источник без realtime читается без потерь: буфер работает
+    как блокирующая очередь - поток захвата ждет, пока кадры заберут,
+    а latest() отдает их по порядку независимо от возраста.
+    """
+
+    # Пауза перед повторным открытием камеры после сбоя чтения
+    REOPEN_DELAY = 0.5
+
+    def __init__(self, source=None, scaling=FRAME_SCALING, buffer_size=FRAME_BUFFER_SIZE, max_age=FRAME_MAX_AGE):
+        self.source = source if source is not None else create_frame_source()
+        self.scaling = scaling
+        self.max_age = max_age
+        self.buffer = deque(maxlen=max(1, buffer_size))
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._seq = 0
+        self._idle_interval = 0.0  # > 0 - теплый резерв: редкое чтение без буферизации
+        self._ended = False  # конечный источник дочитан до конца
+
+    # =========================================================================
+    # УПРАВЛЕНИЕ ПОТОКОМ
+    # =========================================================================
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def idle(self):
+        return self._running and self._idle_interval > 0
+
+    @property
+    def lossless(self):
+        """Без потерь: конечный источник, читаемый так быстро, как забирают кадры."""
+        return not self.source.live and not self.source.realtime
+
+    @property
+    def ended(self):
+        """Конечный источник закончился: поток кадров завершен, повторного чтения нет."""
+        return self._ended
+
+    def start(self):
+        if self._ended: return
+        if self._running:
+            if self._idle_interval:
+                # Выход из резерва: полная частота без переоткрытия источника
+                with self._cond:
+                    self._idle_interval = 0.0
+                    self._cond.notify_all()
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="FrameGrabber", daemon=True)
+        self._thread.start()
+
+    def standby(self, fps):
+        """
+        Теплый резерв: источник остается открытым (или открывается заранее),
+        кадры читаются с частотой fps и отбрасываются. Следующий start()
+        сразу возвращает полную частоту.
+        """
+        self.start()
+        with self._cond:
+            self._idle_interval = 1.0 / max(fps, 0.1)
+            self.buffer.clear()
+
+    def stop(self):
+        self._running = False
+        self._idle_interval = 0.0
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.buffer.clear()
+
+    def _open_capture(self):
+        if not self.source.open():
+            self.source.release()
+            return None
+        return self.source
+
+    def _capture_loop(self):
+        cap = None
+        try:
+            while self._running:
+                if cap is None:
+                    cap = self._open_capture()
+                    if cap is None:
+                        if not self.source.live: break
+                        time.sleep(self.REOPEN_DELAY)
+                        continue
+
+                if self._idle_interval and not self.source.live:
+                    # Резерв конечного источника: кадры файла не тратятся впустую
+                    with self._cond:
+                        if self._idle_interval:
+                            self._cond.wait(self._idle_interval)
+                    continue
+
+                t0 = time.perf_counter()
+                ret, frame = cap.read()
+                ts = time.monotonic()
+                METRICS.record('capture.read', time.perf_counter() - t0)
+                if not ret:
+                    cap.release()
+                    cap = None
+                    # Конец файла/папки - поток завершается окончательно
+                    if not self.source.live:
+                        self._ended = True
+                        break
+                    # Камера отвалилась - переоткрываем
+                    time.sleep(self.REOPEN_DELAY)
+                    continue
+
+                if self._idle_interval:
+                    # Резерв: кадр никому не нужен, ждем следующего чтения
+                    # (start() прерывает ожидание)
+                    with self._cond:
+                        if self._idle_interval:
+                            self._cond.wait(self._idle_interval)
+                    continue
+
+                try:
+                    with METRICS.span('capture.resize'):
+                        small = cv2.resize(frame, (0, 0), fx=self.scaling, fy=self.scaling)
+                        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+                except Exception:
+                    continue
+
+                with self._cond:
+                    # Без потерь: ждем свободного места вместо вытеснения старого кадра
+                    while self.lossless and self._running and len(self.buffer) >= self.buffer.maxlen:
+                        self._cond.wait()
+                    if not self._running: break
+                    self._seq += 1
+                    self.buffer.append(Frame(self._seq, ts, frame, rgb_small))
+                    self._cond.notify_all()
+        finally:
+            if cap is not None:
+                cap.release()
+            self._running = False
+            with self._cond:
+                self._cond.notify_all()
+
+    # =========================================================================
+    # ЧТЕНИЕ КАДРОВ
+    # =========================================================================
+
+    def _fresh_latest(self, after_seq, max_age):
+        if self.lossless:
+            # Очередь: следующий по порядку кадр новее after_seq, возраст не важен
+            while self.buffer:
+                frame = self.buffer.popleft()
+                self._cond.notify_all()
+                if frame.seq > after_seq: return frame
+            return None
+        if not self.buffer: return None
+        frame = self.buffer[-1]
+        if frame.seq <= after_seq: return None
+        if time.monotonic() - frame.ts > max_age: return None
+        return frame
+
+    def latest(self, max_age=None, timeout=0.0, after_seq=0):
+        """
+        Последний свежий кадр (в режиме без потерь - следующий кадр очереди).
+
+        Args:
+            max_age: максимальный возраст кадра (сек), по умолчанию self.max_age.
+            timeout: сколько ждать, если свежего кадра нет (0 - не ждать).
+            after_seq: вернуть только кадр новее этого номера
+                       (чтобы не анализировать один и тот же кадр дважды).
+
+        Returns:
+            Frame или None.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                frame = self._fresh_latest(after_seq, max_age)
+                if frame is not None or not self._running:
+                    return frame
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def peek(self):
+        """Последний кадр без ожидания и без извлечения из очереди (None - кадров нет)."""
+        with self._cond:
+            if not self.buffer: return None
+            frame = self.buffer[-1]
+            if not self.lossless and time.monotonic() - frame.ts > self.max_age: return None
+            return frame
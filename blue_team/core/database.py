@@ -3,18 +3,35 @@ import pickle
 import os
 from pathlib import Path
 
+import numpy as np
+
 # Импортируем путь из конфигурации
 from ..config import DB_PATH 
 # Импортируем криптографию
 from .crypto import CryptoManager
+# Бинарный формат эталонов лиц
+from .gallery import (
+    EMBEDDING_DIM, ENCODING_BYTES, encoding_to_bytes, encoding_from_bytes, pack_gallery, unpack_gallery
+)
 
 class DatabaseManager:
     """
     Менеджер базы данных.
     Отвечает за хранение пользователей, ролей, объектов защиты и ключей шифрования.
     Thread-safe реализация (использует локальные курсоры).
+
+    Изменения таблиц из JOURNALED_TABLES записываются триггерами в журнал
+    change_log (монотонная ревизия seq). Потребители (сервис, VisionSystem)
+    запоминают ревизию и при RELOAD_CONFIG применяют только изменения
+    после нее. Триггеры работают на уровне SQLite, поэтому журнал видит
+    изменения из любого процесса (Конфигуратор, Сервис).
     """
 
+    # Таблицы, изменения которых пишутся в журнал
+    JOURNALED_TABLES = ('users', 'apps')
+    # Сколько последних записей журнала хранить
+    CHANGE_LOG_KEEP = 10000
+
     def __init__(self):
         self.db_path = str(DB_PATH)
         
@@ -29,6 +46,7 @@ class DatabaseManager:
         
         self._init_tables()
         self._seed_roles()
+        self.prune_change_log()
 
     def _init_tables(self):
         """Создание структуры таблиц."""
@@ -93,6 +111,61 @@ class DatabaseManager:
                 FOREIGN KEY(app_id) REFERENCES apps(id) ON DELETE CASCADE
             )
         """)
+
+        # 7. Снимок галереи лиц (одна строка, один зашифрованный BLOB)
+        # Формат - см. gallery.pack_gallery. Позволяет загрузить всю галерею
+        # одной расшифровкой вместо расшифровки и unpickle каждой строки users.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS face_gallery (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                enc_blob BLOB NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # 8. Журнал изменений (для инкрементального RELOAD_CONFIG)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tbl TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                op TEXT NOT NULL
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS db_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER
+            )
+        """)
+        for table in self.JOURNALED_TABLES:
+            for op, event, ref in (('I', 'INSERT', 'NEW'), ('U', 'UPDATE', 'NEW'), ('D', 'DELETE', 'OLD')):
+                cur.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        INSERT INTO change_log (tbl, row_id, op) VALUES ('{table}', {ref}.id, '{op}');
+                    END
+                """)
+
+        # 9. Дополнительные эталоны сотрудников (основной - в users.enc_encoding)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS user_templates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                enc_encoding BLOB NOT NULL
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_user_templates_user ON user_templates(user_id)")
+        # Изменение эталонов - это изменение сотрудника для журнала
+        for event, ref in (('INSERT', 'NEW'), ('DELETE', 'OLD')):
+            cur.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_user_templates_{event.lower()}
+                AFTER {event} ON user_templates
+                BEGIN
+                    INSERT INTO change_log (tbl, row_id, op) VALUES ('users', {ref}.user_id, 'U');
+                END
+            """)
         
         self.conn.commit()
         cur.close()
@@ -112,6 +185,67 @@ class DatabaseManager:
         finally:
             cur.close()
 
+    # =========================================================================
+    # ЖУРНАЛ ИЗМЕНЕНИЙ
+    # =========================================================================
+
+    def prune_change_log(self):
+        """
+        Обрезает журнал до CHANGE_LOG_KEEP последних записей.
+        Вызывается при открытии БД и сервисом после каждого RELOAD_CONFIG.
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.execute("SELECT max(seq) FROM change_log")
+            top = cur.fetchone()[0] or 0
+            cutoff = top - self.CHANGE_LOG_KEEP
+            if cutoff > self._get_meta('change_log_pruned'):
+                cur.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff,))
+                cur.execute("INSERT OR REPLACE INTO db_meta (key, value) VALUES ('change_log_pruned', ?)", (cutoff,))
+                self.conn.commit()
+        except Exception:
+            pass
+        finally:
+            cur.close()
+
+    def _get_meta(self, key):
+        cur = self.conn.cursor()
+        cur.execute("SELECT value FROM db_meta WHERE key=?", (key,))
+        row = cur.fetchone()
+        cur.close()
+        return row[0] if row and row[0] is not None else 0
+
+    def get_revision(self):
+        """Текущая ревизия БД (последний номер в журнале изменений)."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT max(seq) FROM change_log")
+        rev = cur.fetchone()[0] or 0
+        cur.close()
+        return max(rev, self._get_meta('change_log_pruned'))
+
+    def get_changes(self, table, since):
+        """
+        Изменения таблицы после ревизии since.
+
+        Returns:
+            tuple: (новая_ревизия, {row_id: последняя_операция 'I'/'U'/'D'}),
+            либо None, если нужные записи журнала уже удалены
+            (потребитель должен перечитать таблицу целиком).
+        """
+        if since < self._get_meta('change_log_pruned'):
+            return None
+        revision = self.get_revision()
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT row_id, op FROM change_log WHERE tbl=? AND seq>? AND seq<=? ORDER BY seq",
+            (table, since, revision)
+        )
+        changes = {}
+        for row_id, op in cur.fetchall():
+            changes[row_id] = op
+        cur.close()
+        return revision, changes
+
     # =========================================================================
     # УПРАВЛЕНИЕ РОЛЯМИ
     # =========================================================================
@@ -152,26 +286,58 @@ class DatabaseManager:
     # =========================================================================
 
     def add_user(self, name, role, face_encoding):
-        if face_encoding is None:
-            return False
+        return self.add_users([(name, role, face_encoding)]) == 1
+
+    def add_users(self, users):
+        """
+        Пакетное добавление сотрудников [(name, role, face_encoding), ...].
+        face_encoding - один вектор или несколько эталонов (K, 128):
+        первый хранится в users, остальные - в user_templates.
+        Снимок галереи обновляется один раз на весь пакет.
+
+        Returns:
+            int: число добавленных сотрудников.
+        """
         cur = self.conn.cursor()
+        added = []  # (uid, эталон) для снимка галереи - по всем эталонам
+        user_count = 0
         try:
-            # Сериализация + Шифрование биометрии
-            encoding_bytes = pickle.dumps(face_encoding)
-            encrypted_blob = self.crypto.encrypt_bytes(encoding_bytes)
-            
-            cur.execute(
-                "INSERT INTO users (name, role, enc_encoding) VALUES (?, ?, ?)",
-                (name, role, encrypted_blob)
-            )
+            for name, role, face_encoding in users:
+                if face_encoding is None:
+                    continue
+                encs = np.asarray(face_encoding, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+                if not len(encs):
+                    continue
+                # Сериализация (сырые float32) + Шифрование биометрии
+                encrypted_blob = self.crypto.encrypt_bytes(encoding_to_bytes(encs[0]))
+                
+                cur.execute(
+                    "INSERT INTO users (name, role, enc_encoding) VALUES (?, ?, ?)",
+                    (name, role, encrypted_blob)
+                )
+                uid = cur.lastrowid
+                self._insert_templates(cur, uid, encs[1:])
+                added.extend((uid, enc) for enc in encs)
+                user_count += 1
             self.conn.commit()
-            return True
         except Exception as e:
             print(f"Error adding user: {e}")
-            return False
+            self.conn.rollback()
+            return 0
         finally:
             cur.close()
 
+        if added:
+            self._gallery_append(added)
+        return user_count
+
+    def _insert_templates(self, cur, uid, encodings):
+        for enc in encodings:
+            cur.execute(
+                "INSERT INTO user_templates (user_id, enc_encoding) VALUES (?, ?)",
+                (uid, self.crypto.encrypt_bytes(encoding_to_bytes(enc)))
+            )
+
     def get_users(self):
         """Возвращает список пользователей для UI."""
         cur = self.conn.cursor()
@@ -181,19 +347,189 @@ class DatabaseManager:
         cur.close()
         return result
     
+    def get_encodings_by_ids(self, ids):
+        """Как get_all_encodings, но только для указанных id (инкрементальная загрузка)."""
+        ids = list(ids)
+        result = []
+        cur = self.conn.cursor()
+        # Ограничение SQLite на число параметров - читаем порциями
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            cur.execute(f"""
+                SELECT id, name, role, enc_encoding FROM users WHERE id IN ({marks})
+                UNION ALL
+                SELECT u.id, u.name, u.role, t.enc_encoding
+                FROM user_templates t JOIN users u ON u.id = t.user_id
+                WHERE u.id IN ({marks})
+            """, chunk + chunk)
+            result.extend(cur.fetchall())
+        cur.close()
+        return result
+
     def get_all_encodings(self):
-        """Возвращает сырые данные (включая зашифрованный BLOB) для VisionSystem."""
+        """
+        Возвращает сырые данные (включая зашифрованный BLOB) для VisionSystem.
+        По строке на эталон: у сотрудника с несколькими эталонами - несколько строк.
+        """
         cur = self.conn.cursor()
-        cur.execute("SELECT id, name, role, enc_encoding FROM users")
+        cur.execute("""
+            SELECT id, name, role, enc_encoding FROM users
+            UNION ALL
+            SELECT u.id, u.name, u.role, t.enc_encoding
+            FROM user_templates t JOIN users u ON u.id = t.user_id
+        """)
         result = cur.fetchall()
         cur.close()
         return result
 
     def delete_user(self, uid):
         cur = self.conn.cursor()
+        # Сначала эталоны: последней записью журнала для сотрудника будет удаление
+        cur.execute("DELETE FROM user_templates WHERE user_id=?", (uid,))
         cur.execute("DELETE FROM users WHERE id=?", (uid,))
         self.conn.commit()
         cur.close()
+        self._gallery_remove([uid])
+
+    # =========================================================================
+    # ГАЛЕРЕЯ ЛИЦ (БИНАРНЫЙ СНИМОК)
+    # =========================================================================
+
+    def decode_encoding(self, enc_blob):
+        """
+        Расшифровывает эталон одной строки users.
+        Понимает оба формата: сырые float32 (512 байт) и старый pickle.
+        """
+        data = self.crypto.decrypt_bytes(enc_blob)
+        if len(data) == ENCODING_BYTES:
+            return encoding_from_bytes(data)
+        return np.asarray(pickle.loads(data), dtype=np.float32)
+
+    def migrate_encodings(self):
+        """
+        Переводит строки users из pickle в сырой формат float32.
+
+        Returns:
+            int: число перезаписанных строк.
+        """
+        cur = self.conn.cursor()
+        migrated = 0
+        try:
+            cur.execute("SELECT id, enc_encoding FROM users")
+            for uid, blob in cur.fetchall():
+                try:
+                    data = self.crypto.decrypt_bytes(blob)
+                    if len(data) == ENCODING_BYTES:
+                        continue
+                    raw = encoding_to_bytes(pickle.loads(data))
+                    cur.execute("UPDATE users SET enc_encoding=? WHERE id=?",
+                                (self.crypto.encrypt_bytes(raw), uid))
+                    migrated += 1
+                except Exception as e:
+                    print(f"[DB] Не удалось перевести эталон #{uid}: {e}")
+            self.conn.commit()
+        finally:
+            cur.close()
+        if migrated:
+            print(f"[DB] Эталонов переведено в бинарный формат: {migrated}")
+        return migrated
+
+    def _read_gallery_snapshot(self):
+        """(user_ids, matrix) из снимка или None, если снимка нет/он поврежден."""
+        cur = self.conn.cursor()
+        cur.execute("SELECT enc_blob FROM face_gallery WHERE id=1")
+        row = cur.fetchone()
+        cur.close()
+        if not row:
+            return None
+        try:
+            # Одна расшифровка на всю галерею, далее - view без копий
+            return unpack_gallery(self.crypto.decrypt_bytes(row[0]))
+        except Exception as e:
+            print(f"[DB] Снимок галереи поврежден: {e}")
+            return None
+
+    def _write_gallery_snapshot(self, user_ids, matrix):
+        blob = self.crypto.encrypt_bytes(pack_gallery(user_ids, matrix))
+        cur = self.conn.cursor()
+        cur.execute(
+            "INSERT OR REPLACE INTO face_gallery (id, enc_blob, updated_at) VALUES (1, ?, CURRENT_TIMESTAMP)",
+            (blob,)
+        )
+        self.conn.commit()
+        cur.close()
+
+    def rebuild_gallery_snapshot(self):
+        """
+        Пересобирает снимок из строк users и user_templates (медленный путь: расшифровка
+        каждой строки). Заодно переводит старые pickle-строки в новый формат.
+
+        Returns:
+            tuple: (user_ids, matrix)
+        """
+        self.migrate_encodings()
+        ids, vectors = [], []
+        for uid, _, _, blob in self.get_all_encodings():
+            try:
+                vectors.append(self.decode_encoding(blob))
+                ids.append(uid)
+            except Exception:
+                continue
+        matrix = np.vstack(vectors).astype(np.float32) if vectors else np.empty((0, EMBEDDING_DIM), np.float32)
+        user_ids = np.asarray(ids, dtype=np.int64)
+        self._write_gallery_snapshot(user_ids, matrix)
+        print(f"[DB] Снимок галереи пересобран: {len(user_ids)} эталонов")
+        return user_ids, matrix
+
+    def _gallery_append(self, items):
+        """Дописывает [(user_id, encoding), ...] в снимок галереи."""
+        snapshot = self._read_gallery_snapshot()
+        if snapshot is None:
+            self.rebuild_gallery_snapshot()
+            return
+        ids, matrix = snapshot
+        new_ids = np.asarray([uid for uid, _ in items], dtype=np.int64)
+        new_vecs = np.asarray([enc for _, enc in items], dtype=np.float32).reshape(-1, matrix.shape[1])
+        self._write_gallery_snapshot(np.concatenate([ids, new_ids]), np.vstack([matrix, new_vecs]))
+
+    def _gallery_remove(self, user_ids):
+        """Удаляет эталоны сотрудников из снимка галереи."""
+        snapshot = self._read_gallery_snapshot()
+        if snapshot is None:
+            return
+        ids, matrix = snapshot
+        keep = ~np.isin(ids, np.asarray(list(user_ids), dtype=np.int64))
+        self._write_gallery_snapshot(ids[keep], matrix[keep])
+
+    def load_gallery(self):
+        """
+        Быстрая загрузка всей галереи для VisionSystem.
+
+        Снимок расшифровывается одним вызовом и разбирается через np.frombuffer.
+        Имена и роли берутся одним запросом из users. Если снимок отсутствует
+        или не совпадает с таблицей users (например, после старой версии),
+        он пересобирается.
+
+        Returns:
+            tuple: (user_ids, names, roles, matrix)
+        """
+        cur = self.conn.cursor()
+        cur.execute("SELECT id, name, role FROM users")
+        meta = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        cur.execute("SELECT count(*) FROM user_templates t JOIN users u ON u.id = t.user_id")
+        n_templates = cur.fetchone()[0]
+        cur.close()
+
+        snapshot = self._read_gallery_snapshot()
+        if (snapshot is None or set(snapshot[0].tolist()) != set(meta)
+                or len(snapshot[0]) != len(meta) + n_templates):
+            snapshot = self.rebuild_gallery_snapshot()
+        user_ids, matrix = snapshot
+
+        names = [meta.get(int(uid), ("", ""))[0] for uid in user_ids]
+        roles = [meta.get(int(uid), ("", ""))[1] for uid in user_ids]
+        return user_ids, names, roles, matrix
 
     # =========================================================================
     # УПРАВЛЕНИЕ ПРИЛОЖЕНИЯМИ
@@ -229,6 +565,28 @@ class DatabaseManager:
         cur.close()
         return result
 
+    def get_role_permissions(self):
+        """
+        Права ролей для разбиения галереи лиц (сервис, RELOAD_CONFIG).
+
+        Returns:
+            tuple: ({exe_name в нижнем регистре: {роли}} для активных приложений,
+                    {file_id: {роли}})
+        """
+        cur = self.conn.cursor()
+        app_roles, file_roles = {}, {}
+        cur.execute("""
+            SELECT a.exe_name, p.role FROM app_permissions p
+            JOIN apps a ON a.id = p.app_id WHERE a.is_active=1
+        """)
+        for exe, role in cur.fetchall():
+            app_roles.setdefault(exe.lower(), set()).add(role)
+        cur.execute("SELECT file_id, role FROM file_permissions")
+        for fid, role in cur.fetchall():
+            file_roles.setdefault(fid, set()).add(role)
+        cur.close()
+        return app_roles, file_roles
+
     def get_all_apps_raw(self):
         cur = self.conn.cursor()
         cur.execute("SELECT id, name, exe_name, is_active FROM apps")
@@ -239,8 +597,21 @@ class DatabaseManager:
     def get_apps(self):
         """Для потока мониторинга (возвращает только активные)."""
         cur = self.conn.cursor()
-        cur.execute("SELECT exe_name, name, is_active FROM apps WHERE is_active=1")
-        result = [{"exe": row[0], "name": row[1]} for row in cur.fetchall()]
+        cur.execute("SELECT exe_name, name, is_active, id FROM apps WHERE is_active=1")
+        result = [{"exe": row[0], "name": row[1], "id": row[3]} for row in cur.fetchall()]
+        cur.close()
+        return result
+
+    def get_apps_by_ids(self, ids):
+        """Текущее состояние указанных приложений (включая неактивные)."""
+        ids = list(ids)
+        result = []
+        cur = self.conn.cursor()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            cur.execute(f"SELECT id, exe_name, name, is_active FROM apps WHERE id IN ({marks})", chunk)
+            result.extend({"id": r[0], "exe": r[1], "name": r[2], "is_active": r[3]} for r in cur.fetchall())
         cur.close()
         return result
 
@@ -0,0 +1,240 @@
+import os
+import threading
+
+import cv2
+import face_recognition
+import numpy as np
+from collections import namedtuple
+
+from ..config import (
+    FRAME_SCALING, DETECTION_MODE, ROI_PADDING, ROI_TARGET_FACE_SIZE, ROI_FULL_SCAN_EVERY,
+    PREDETECT_ENABLED, PREDETECT_CASCADE, PREDETECT_WIDTH, PREDETECT_MIN_NEIGHBORS, PREDETECT_PADDING
+)
+
+# Результат детекции:
+# image     - RGB-изображение, на котором искали лица (по нему же считаются encodings);
+# locations - рамки (top, right, bottom, left) в координатах image;
+# scale     - масштаб image относительно полного кадра;
+# offset    - (y, x) левого верхнего угла image в полном кадре.
+DetectionResult = namedtuple('DetectionResult', ['image', 'locations', 'scale', 'offset'])
+
+
+def to_full_frame(result, loc):
+    """Переводит рамку из координат result.image в координаты полного кадра."""
+    top, right, bottom, left = loc
+    oy, ox = result.offset
+    s = result.scale
+    return (int(top / s) + oy, int(right / s) + ox, int(bottom / s) + oy, int(left / s) + ox)
+
+
+class CascadePreDetector:
+    """
+    Дешевый каскадный детектор (Haar/LBP) перед HOG.
+
+    Каскад работает на серой миниатюре шириной не больше width px:
+    - кандидатов нет - кадр отбрасывается, HOG не запускается вовсе;
+    - кандидаты есть - HOG запускается только на их общей рамке
+      (с запасом padding), а не на всем изображении.
+    Найденные HOG рамки возвращаются в координатах исходного изображения,
+    поэтому результат взаимозаменяем с face_recognition.face_locations.
+
+    Экземпляр не потокобезопасен (см. get_predetector).
+    """
+
+    # Минимальный размер кандидата на миниатюре (px)
+    MIN_SIZE = 20
+
+    def __init__(self, cascade=PREDETECT_CASCADE, width=PREDETECT_WIDTH,
+                 min_neighbors=PREDETECT_MIN_NEIGHBORS, padding=PREDETECT_PADDING):
+        path = cascade if os.path.isfile(cascade) else os.path.join(cv2.data.haarcascades, cascade)
+        self.classifier = cv2.CascadeClassifier(path)
+        if self.classifier.empty():
+            raise ValueError(f"Не удалось загрузить каскад: {path}")
+        self.width = width
+        self.min_neighbors = min_neighbors
+        self.padding = padding
+        self.stats = {'frames': 0, 'rejected': 0}
+
+    def regions(self, rgb):
+        """Рамки кандидатов (top, right, bottom, left) с запасом, в координатах rgb."""
+        h, w = rgb.shape[:2]
+        scale = min(1.0, self.width / w)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        if scale < 1.0:
+            gray = cv2.resize(gray, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        cv2.equalizeHist(gray, dst=gray)
+        found = self.classifier.detectMultiScale(
+            gray, scaleFactor=1.1, minNeighbors=self.min_neighbors,
+            minSize=(self.MIN_SIZE, self.MIN_SIZE)
+        )
+
+        boxes = []
+        for x, y, bw, bh in found:
+            pad = self.padding * max(bw, bh)
+            boxes.append((
+                max(0, int((y - pad) / scale)),
+                min(w, int((x + bw + pad) / scale)),
+                min(h, int((y + bh + pad) / scale)),
+                max(0, int((x - pad) / scale))
+            ))
+        return boxes
+
+    def locate(self, rgb):
+        """Аналог face_recognition.face_locations(rgb) с отсевом по каскаду."""
+        self.stats['frames'] += 1
+        boxes = self.regions(rgb)
+        if not boxes:
+            self.stats['rejected'] += 1
+            return []
+
+        top = min(b[0] for b in boxes)
+        right = max(b[1] for b in boxes)
+        bottom = max(b[2] for b in boxes)
+        left = min(b[3] for b in boxes)
+        crop = np.ascontiguousarray(rgb[top:bottom, left:right])
+        locs = face_recognition.face_locations(crop)
+        return [(t + top, r + left, b + top, l + left) for t, r, b, l in locs]
+
+
+_local = threading.local()
+
+
+def get_predetector():
+    """
+    Пред-детектор текущего потока/процесса или None, если он выключен
+    (config.PREDETECT_ENABLED) или каскад не загрузился.
+    """
+    if not PREDETECT_ENABLED:
+        return None
+    pre = getattr(_local, 'predetector', None)
+    if pre is None:
+        try:
+            pre = CascadePreDetector()
+        except Exception as e:
+            print(f"[VISION] Пред-детектор отключен: {e}")
+            pre = False
+        _local.predetector = pre
+    return pre or None
+
+
+def locate_faces(rgb):
+    """face_recognition.face_locations с каскадным пред-детектором (если включен)."""
+    pre = get_predetector()
+    if pre is None:
+        return face_recognition.face_locations(rgb)
+    return pre.locate(rgb)
+
+
+class FullFrameDetector:
+    """Классическая схема: весь кадр, уменьшенный в FRAME_SCALING раз."""
+
+    def detect(self, frame):
+        locs = locate_faces(frame.rgb_small)
+        return DetectionResult(frame.rgb_small, locs, FRAME_SCALING, (0, 0))
+
+    def observe(self, full_box):
+        pass
+
+    def reset(self):
+        pass
+
+
+class AdaptiveRoiDetector:
+    """
+    Детекция в адаптивной области интереса (ROI).
+
+    Пока лицо известно, HOG запускается не на всем кадре, а на рамке прошлого
+    лица с запасом ROI_PADDING. Масштаб ROI подбирается так, чтобы лицо
+    занимало около ROI_TARGET_FACE_SIZE пикселей:
+    - близкое крупное лицо уменьшается сильнее, чем при FRAME_SCALING
+      (меньше работы);
+    - далекое мелкое лицо анализируется почти в полном разрешении
+      (выше recall, чем при глобальном 0.25).
+
+    Полный кадр сканируется раз в ROI_FULL_SCAN_EVERY кадров (чтобы заметить
+    второго человека) и сразу при промахе ROI. Масштаб полного скана тоже
+    следует за размером последнего лица, но не опускается ниже FRAME_SCALING.
+    Пред-детектор (PREDETECT_ENABLED) применяется только к полному скану:
+    ROI и так ограничена областью лица.
+    """
+
+    # Допустимые масштабы ROI относительно полного кадра
+    MIN_SCALE = 0.1
+    MAX_SCALE = 1.0
+
+    def __init__(self, padding=ROI_PADDING, target_face=ROI_TARGET_FACE_SIZE,
+                 full_scan_every=ROI_FULL_SCAN_EVERY):
+        self.padding = padding
+        self.target_face = target_face
+        self.full_scan_every = full_scan_every
+        self.reset()
+
+    def reset(self):
+        self.last_box = None            # Рамка последнего лица в полном кадре
+        self.face_size = None           # Сглаженный размер лица (px полного кадра)
+        self.frames_since_full = 0
+
+    def _scale_for(self, face_size):
+        scale = self.target_face / max(face_size, 1)
+        return min(self.MAX_SCALE, max(self.MIN_SCALE, scale))
+
+    def detect(self, frame):
+        if self.last_box is not None and self.frames_since_full < self.full_scan_every:
+            result = self._roi_scan(frame)
+            if result.locations:
+                return result
+            # Промах ROI - лицо сместилось или ушло: сразу полный скан
+
+        result = self._full_scan(frame)
+        if not result.locations:
+            # Лица нет во всем кадре - до следующего опознания ROI не используем
+            self.last_box = None
+        return result
+
+    def _full_scan(self, frame):
+        self.frames_since_full = 0
+        scale = FRAME_SCALING
+        if self.face_size:
+            # Мелкое (далекое) лицо - сканируем кадр в большем разрешении
+            scale = max(FRAME_SCALING, self._scale_for(self.face_size))
+
+        if abs(scale - FRAME_SCALING) < 1e-3:
+            image = frame.rgb_small
+        else:
+            small = cv2.resize(frame.bgr, (0, 0), fx=scale, fy=scale)
+            image = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        locs = locate_faces(image)
+        return DetectionResult(image, locs, scale, (0, 0))
+
+    def _roi_scan(self, frame):
+        self.frames_since_full += 1
+        h, w = frame.bgr.shape[:2]
+        top, right, bottom, left = self.last_box
+        pad = int(self.face_size * self.padding)
+
+        y1, y2 = max(0, top - pad), min(h, bottom + pad)
+        x1, x2 = max(0, left - pad), min(w, right + pad)
+        roi = frame.bgr[y1:y2, x1:x2]
+        if roi.size == 0:
+            return DetectionResult(None, [], 1.0, (y1, x1))
+
+        scale = self._scale_for(self.face_size)
+        roi = cv2.resize(roi, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        image = cv2.cvtColor(roi, cv2.COLOR_BGR2RGB)
+        locs = face_recognition.face_locations(image)
+        return DetectionResult(image, locs, scale, (y1, x1))
+
+    def observe(self, full_box):
+        """Запоминает рамку опознанного лица (координаты полного кадра)."""
+        top, right, bottom, left = full_box
+        size = max(bottom - top, right - left)
+        # Экспоненциальное сглаживание, чтобы масштаб не "прыгал"
+        self.face_size = size if self.face_size is None else 0.7 * self.face_size + 0.3 * size
+        self.last_box = full_box
+
+
+def create_detector(mode=DETECTION_MODE):
+    """Детектор лиц для check_authorization по config.DETECTION_MODE."""
+    if mode == "adaptive":
+        return AdaptiveRoiDetector()
+    return FullFrameDetector()
@@ -0,0 +1,111 @@
+import time
+
+from ..config import ENFORCE_RETRY_BASE, ENFORCE_RETRY_MAX
+from .metrics import METRICS
+
+BLOCKED = "blocked"
+UNBLOCKED = "unblocked"
+
+
+class EnforcementReconciler:
+    """
+    Применение санкций к защищаемым процессам по желаемому состоянию.
+
+    Цикл защиты каждый такт сообщает желаемое состояние (set_desired),
+    а reconcile() вызывает SystemController только для PID, у которых
+    примененное состояние отличается от желаемого, - одним пакетом на
+    блокировку и одним на разблокировку. Повторные одинаковые решения
+    ничего не стоят.
+
+    Неудавшаяся операция (процесс не заморозился / не разморозился)
+    повторяется с экспоненциальной задержкой ENFORCE_RETRY_BASE..ENFORCE_RETRY_MAX.
+    """
+
+    def __init__(self, system, retry_base=ENFORCE_RETRY_BASE, retry_max=ENFORCE_RETRY_MAX):
+        self.system = system
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.desired = {}   # PID -> BLOCKED / UNBLOCKED
+        self.applied = {}   # PID -> подтвержденное состояние
+        self._retry = {}    # PID -> (число неудач, время следующей попытки)
+        self.stats = {
+            'reconciles': 0,    # Вызовов reconcile
+            'blocked': 0,       # Переходов в BLOCKED
+            'unblocked': 0,     # Переходов в UNBLOCKED
+            'failures': 0,      # Неудавшихся операций
+            'retries': 0,       # Повторных попыток
+        }
+
+    def set_desired(self, pids, blocked: bool):
+        """
+        Желаемое состояние для всех защищаемых PID текущего такта.
+
+        PID, выпавший из набора (процесс завершился, приложение убрано из
+        черного списка, родитель дерева завершился), но все еще замороженный,
+        остается в наборе с желаемым состоянием UNBLOCKED, пока разморозка
+        не удастся. Остальные выпавшие PID забываются.
+        """
+        state = BLOCKED if blocked else UNBLOCKED
+        desired = dict.fromkeys(pids, state)
+        for pid, applied in self.applied.items():
+            if pid not in desired and (applied == BLOCKED or self._is_blocked(pid)):
+                desired[pid] = UNBLOCKED
+        self.desired = desired
+        for pid in self.desired:
+            if pid not in self.applied:
+                # Новый PID: фактическое состояние - по SystemController
+                self.applied[pid] = BLOCKED if self._is_blocked(pid) else UNBLOCKED
+        for pid in [pid for pid in self.applied if pid not in self.desired]:
+            del self.applied[pid]
+        for pid in [pid for pid in self._retry if pid not in self.desired]:
+            del self._retry[pid]
+
+    def _is_blocked(self, pid):
+        """Фактически заблокирован: заморожен или его окна скрыты."""
+        return pid in self.system.suspended_pids or pid in self.system.blocked_windows
+
+    def reconcile(self):
+        """Применяет только переходы. Возвращает число успешных переходов."""
+        self.stats['reconciles'] += 1
+        now = time.monotonic()
+        pending = {BLOCKED: [], UNBLOCKED: []}
+        for pid, state in self.desired.items():
+            if self.applied.get(pid) == state: continue
+            retry = self._retry.get(pid)
+            if retry is not None:
+                if retry[1] > now: continue
+                self.stats['retries'] += 1
+            pending[state].append(pid)
+
+        changed = 0
+        if pending[BLOCKED]:
+            with METRICS.span('enforce.block'):
+                self.system.block_processes(pending[BLOCKED])
+            # Уже замороженный ранее PID тоже считается заблокированным
+            done = {pid for pid in pending[BLOCKED] if self._is_blocked(pid)}
+            changed += self._settle(pending[BLOCKED], done, BLOCKED, now)
+        if pending[UNBLOCKED]:
+            with METRICS.span('enforce.unblock'):
+                self.system.unblock_processes(pending[UNBLOCKED])
+            done = {pid for pid in pending[UNBLOCKED] if not self._is_blocked(pid)}
+            changed += self._settle(pending[UNBLOCKED], done, UNBLOCKED, now)
+        return changed
+
+    def _settle(self, pids, done, state, now):
+        for pid in pids:
+            if pid in done:
+                self.applied[pid] = state
+                self._retry.pop(pid, None)
+            else:
+                failures = self._retry.get(pid, (0, 0.0))[0] + 1
+                delay = min(self.retry_max, self.retry_base * 2 ** (failures - 1))
+                self._retry[pid] = (failures, now + delay)
+                self.stats['failures'] += 1
+        self.stats[state] += len(done)
+        return len(done)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['tracked'] = len(self.desired)
+        stats['pending_retry'] = len(self._retry)
+        return stats
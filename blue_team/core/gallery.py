@@ -0,0 +1,315 @@
+import struct
+
+import numpy as np
+from collections import namedtuple
+
+from ..config import TEMPLATE_TOP_K, TEMPLATE_MIN_DISTANCE, TEMPLATE_MAX_PER_USER
+from .ann import create_index
+
+# Размерность вектора лица dlib (face_recognition.face_encodings)
+EMBEDDING_DIM = 128
+
+# Бинарный формат одного эталона: 128 x float32 (512 байт)
+ENCODING_BYTES = EMBEDDING_DIM * 4
+
+# Бинарный формат всей галереи (снимок в БД, шифруется целиком):
+# [MAGIC 4][count uint32][dim uint32][reserved uint32] - 16 байт
+# [user_id int64 x count] [float32 x count x dim]
+# Заголовок 16 байт, поэтому массивы выровнены и читаются np.frombuffer без копий.
+GALLERY_MAGIC = b'BTG1'
+_GALLERY_HEADER = struct.Struct('<4sIII')
+
+# Результат сопоставления одного лица с галереей
+FaceMatch = namedtuple('FaceMatch', ['user_id', 'name', 'role', 'distance'])
+
+
+def encoding_to_bytes(encoding):
+    """Вектор лица -> 512 байт float32."""
+    return np.asarray(encoding, dtype='<f4').reshape(EMBEDDING_DIM).tobytes()
+
+
+def encoding_from_bytes(data):
+    """512 байт float32 -> вектор лица (view без копирования)."""
+    return np.frombuffer(data, dtype='<f4', count=EMBEDDING_DIM)
+
+
+def pack_gallery(user_ids, matrix):
+    """Упаковывает id и матрицу эталонов в бинарный снимок."""
+    user_ids = np.asarray(user_ids, dtype='<i8')
+    matrix = np.asarray(matrix, dtype='<f4').reshape(-1, EMBEDDING_DIM)
+    header = _GALLERY_HEADER.pack(GALLERY_MAGIC, len(user_ids), EMBEDDING_DIM, 0)
+    return header + user_ids.tobytes() + matrix.tobytes()
+
+
+def unpack_gallery(data):
+    """
+    Разбирает бинарный снимок галереи без копирования данных.
+
+    Returns:
+        tuple: (user_ids int64[N], matrix float32[N, 128]) - view на data.
+    """
+    magic, count, dim, _ = _GALLERY_HEADER.unpack_from(data, 0)
+    if magic != GALLERY_MAGIC or dim != EMBEDDING_DIM:
+        raise ValueError("Неизвестный формат снимка галереи.")
+    offset = _GALLERY_HEADER.size
+    user_ids = np.frombuffer(data, dtype='<i8', count=count, offset=offset)
+    offset += count * 8
+    matrix = np.frombuffer(data, dtype='<f4', count=count * dim, offset=offset).reshape(count, dim)
+    return user_ids, matrix
+
+
+def prune_templates(encodings, min_distance=TEMPLATE_MIN_DISTANCE, max_count=TEMPLATE_MAX_PER_USER):
+    """
+    Отбор эталонов одного сотрудника при регистрации.
+
+    Первым берется самый "типичный" снимок (ближайший к среднему), далее
+    жадно добавляется снимок, наиболее удаленный от уже выбранных.
+    Почти-дубликаты (ближе min_distance к выбранным) отбрасываются,
+    всего не больше max_count эталонов.
+
+    Returns:
+        ndarray float32 (K, 128) - выбранные эталоны.
+    """
+    encs = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    if len(encs) <= 1:
+        return encs
+
+    first = int(np.argmin(np.linalg.norm(encs - encs.mean(axis=0), axis=1)))
+    chosen = [first]
+    # Расстояние каждого снимка до ближайшего выбранного
+    nearest = np.linalg.norm(encs - encs[first], axis=1)
+    while len(chosen) < max_count:
+        idx = int(np.argmax(nearest))
+        if nearest[idx] < min_distance:
+            break
+        chosen.append(idx)
+        np.minimum(nearest, np.linalg.norm(encs - encs[idx], axis=1), out=nearest)
+    return encs[chosen]
+
+
+class FaceGallery:
+    """
+    Галерея эталонов лиц в виде одной непрерывной матрицы.
+
+    Все векторы хранятся в массиве float32 формы (N, 128), рядом лежат
+    параллельные массивы id/имен/ролей. Сравнение всех лиц кадра со всей
+    галереей выполняется одним матричным умножением:
+        |q - g|^2 = |q|^2 + |g|^2 - 2 * q·g
+
+    Для больших галерей (config.GALLERY_INDEX = "ivf") поверх матрицы
+    строится приближенный индекс IVFIndex, и match() перебирает только
+    ближайшие кластеры.
+
+    У сотрудника может быть несколько эталонов (строки с одинаковым
+    user_id). Тогда сравнение двухэтапное: сначала с центроидами
+    сотрудников, где |q - c| - r (r - радиус кластера эталонов) - нижняя
+    граница расстояния до любого его эталона; затем точное сравнение
+    только с эталонами TEMPLATE_TOP_K лучших кандидатов. Индекс IVFIndex
+    в этом случае строится по центроидам сотрудников.
+
+    Экземпляр не изменяется после построения. VisionSystem собирает новую
+    галерею (вместе с индексом) и подменяет ссылку целиком, поэтому поток
+    IPC может обновлять кэш, не мешая циклу защиты.
+    """
+
+    def __init__(self, user_ids=(), names=(), roles=(), encodings=None):
+        if encodings is None or len(encodings) == 0:
+            matrix = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        elif isinstance(encodings, np.ndarray) and encodings.ndim == 2:
+            # Готовая матрица (например, view на снимок из БД) - без копирования
+            matrix = np.ascontiguousarray(encodings, dtype=np.float32)
+        else:
+            matrix = np.ascontiguousarray(np.vstack(encodings), dtype=np.float32)
+
+        self.embeddings = matrix
+        # Квадраты норм эталонов считаем один раз при построении
+        self.sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.names = np.asarray(names, dtype=object)
+        self.roles = np.asarray(roles, dtype=object)
+        self.index = None  # IVFIndex или None (полный перебор)
+
+        if not (len(self.user_ids) == len(self.names) == len(self.roles) == len(matrix)):
+            raise ValueError("Размеры массивов галереи не совпадают.")
+
+        self._partitions = {}   # Кэш разделов по ролям (см. for_roles)
+        self.centroids = None   # Центроиды сотрудников (только при нескольких эталонах)
+        if len(np.unique(self.user_ids)) < len(self.user_ids):
+            self._build_centroids()
+
+    def _build_centroids(self):
+        """Центроид, радиус и список эталонов каждого сотрудника."""
+        order = np.argsort(self.user_ids, kind='stable')
+        _, starts, counts = np.unique(self.user_ids[order], return_index=True, return_counts=True)
+        members = self.embeddings[order]
+
+        centroids = np.add.reduceat(members, starts, axis=0) / counts[:, None].astype(np.float32)
+        owner = np.repeat(np.arange(len(starts)), counts)
+        spread = np.linalg.norm(members - centroids[owner], axis=1)
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.centroid_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.radii = np.maximum.reduceat(spread, starts)
+        self.member_order = order       # Индексы эталонов, сгруппированные по сотрудникам
+        self.member_starts = starts
+        self.member_counts = counts
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def with_changes(self, upserts=(), deleted_ids=()):
+        """
+        Новая галерея с учетом изменений (инкрементальная перезагрузка).
+
+        Args:
+            upserts: кортежи (user_id, name, role, encoding) добавленных
+                     или измененных сотрудников.
+            deleted_ids: id удаленных сотрудников.
+
+        Неизмененные строки копируются из текущей матрицы без расшифровки.
+        ANN-индекс не переносится - его строит build_index().
+        """
+        upserts = list(upserts)
+        drop = set(deleted_ids) | {row[0] for row in upserts}
+        if not upserts and not drop:
+            return self
+
+        keep = ~np.isin(self.user_ids, np.fromiter(drop, dtype=np.int64, count=len(drop)))
+        if upserts:
+            ids, names, roles, encs = zip(*upserts)
+            new_matrix = np.asarray(encs, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        else:
+            ids, names, roles, new_matrix = (), (), (), np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+        return FaceGallery(
+            np.concatenate([self.user_ids[keep], np.asarray(ids, dtype=np.int64)]),
+            np.concatenate([self.names[keep], np.asarray(names, dtype=object)]),
+            np.concatenate([self.roles[keep], np.asarray(roles, dtype=object)]),
+            np.vstack([self.embeddings[keep], new_matrix])
+        )
+
+    def for_roles(self, roles):
+        """
+        Раздел галереи: только сотрудники с указанными ролями.
+
+        Разделы строятся при первом запросе и кэшируются в этом экземпляре.
+        Галерея неизменяема, поэтому после RELOAD_CONFIG новая галерея
+        строит свои разделы заново и они не расходятся с данными.
+        """
+        key = frozenset(roles)
+        part = self._partitions.get(key)
+        if part is None:
+            mask = np.fromiter((r in key for r in self.roles), dtype=bool, count=len(self.roles))
+            if mask.all():
+                part = self
+            else:
+                part = FaceGallery(
+                    self.user_ids[mask], self.names[mask], self.roles[mask], self.embeddings[mask]
+                ).build_index(previous=self)
+            self._partitions[key] = part
+        return part
+
+    def build_index(self, previous=None):
+        """
+        Строит ANN-индекс по настройкам config.py.
+        previous - галерея до перезагрузки: ее квантизатор переиспользуется,
+        если размер изменился несильно.
+        """
+        prev_index = previous.index if previous is not None else None
+        if self.centroids is not None:
+            # Первый этап двухэтапного сравнения - центроиды сотрудников:
+            # индекс строится по ним, а не по эталонам
+            self.index = create_index(self.centroids, prev_index)
+        else:
+            self.index = create_index(self.embeddings, prev_index)
+        return self
+
+    def _squared_distances(self, queries, matrix=None, sq_norms=None):
+        if matrix is None:
+            matrix, sq_norms = self.embeddings, self.sq_norms
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        sq = queries @ matrix.T
+        sq *= -2.0
+        sq += q_norms[:, None]
+        sq += sq_norms[None, :]
+        # Погрешность float32 может дать небольшие отрицательные значения
+        np.maximum(sq, 0.0, out=sq)
+        return sq
+
+    def match(self, encodings, tolerance):
+        """
+        Находит ближайшего сотрудника для каждого лица кадра.
+
+        Returns:
+            list: FaceMatch для каждого лица либо None, если ближайший
+                  эталон дальше порога tolerance.
+        """
+        if len(encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [None] * len(encodings)
+
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if self.centroids is not None:
+            return self._match_two_stage(queries, tolerance)
+        if self.index is not None:
+            best, best_sq = self.index.search(queries)
+            best_dist = np.sqrt(best_sq)
+        else:
+            sq = self._squared_distances(queries)
+            best = np.argmin(sq, axis=1)
+            best_dist = np.sqrt(sq[np.arange(len(queries)), best])
+
+        results = []
+        for idx, dist in zip(best, best_dist):
+            if dist <= tolerance:
+                results.append(self._make_match(idx, dist))
+            else:
+                results.append(None)
+        return results
+
+    def _match_two_stage(self, queries, tolerance):
+        """
+        Центроиды сотрудников -> эталоны лучших кандидатов.
+        С ANN-индексом (по центроидам) нижние границы считаются только
+        для сотрудников из n_probe ближайших списков.
+        """
+        if self.index is None:
+            centroid_dist = np.sqrt(self._squared_distances(queries, self.centroids, self.centroid_sq))
+            all_users = np.arange(len(self.centroids))
+            scopes = [(all_users, row - self.radii) for row in centroid_dist]
+        else:
+            scopes = []
+            for q in queries:
+                users = self.index.probe_rows(q)
+                dist = np.sqrt(self._squared_distances(q[None, :], self.centroids[users], self.centroid_sq[users])[0])
+                scopes.append((users, dist - self.radii[users]))
+
+        results = []
+        for q, (users, user_bounds) in zip(queries, scopes):
+            passed = user_bounds <= tolerance
+            top = np.argsort(user_bounds[passed], kind='stable')[:TEMPLATE_TOP_K]
+            candidates, bounds = users[passed][top], user_bounds[passed][top]
+
+            best_idx, best_dist = -1, np.inf
+            for u, bound in zip(candidates, bounds):
+                # Кандидаты идут по возрастанию нижней границы: дальше лучше не найти
+                if bound > best_dist:
+                    break
+                start = self.member_starts[u]
+                members = self.member_order[start:start + self.member_counts[u]]
+                dist = np.sqrt(self._squared_distances(q[None, :], self.embeddings[members], self.sq_norms[members])[0])
+                j = int(np.argmin(dist))
+                if dist[j] < best_dist:
+                    best_idx, best_dist = members[j], dist[j]
+
+            results.append(self._make_match(best_idx, best_dist) if best_dist <= tolerance else None)
+        return results
+
+    def _make_match(self, idx, dist):
+        return FaceMatch(
+            int(self.user_ids[idx]),
+            self.names[idx],
+            self.roles[idx],
+            float(dist)
+        )
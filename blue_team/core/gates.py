@@ -0,0 +1,109 @@
+import time
+
+import cv2
+import numpy as np
+
+from ..config import (
+    SCENE_CHANGE_THRESHOLD, SCENE_GATE_MAX_AGE, QUALITY_DARK_LEVEL, QUALITY_BRIGHT_LEVEL,
+    QUALITY_MAX_DARK_RATIO, QUALITY_MAX_BRIGHT_RATIO, QUALITY_MIN_SHARPNESS
+)
+
+
+class SceneChangeGate:
+    """
+    Дешевый фильтр "сцена не изменилась" перед распознаванием.
+
+    После успешного опознания запоминается миниатюра кадра (серая, 32x24).
+    Пока новые кадры отличаются от нее меньше порога (средняя абсолютная
+    разность яркости) и с опознания прошло не больше max_age секунд,
+    прошлый результат переиспользуется без детекции и кодирования.
+
+    Сравнение идет с кадром опознания, а не с предыдущим кадром, поэтому
+    медленные изменения тоже накапливаются и рано или поздно вызывают
+    полное распознавание.
+    """
+
+    THUMB_SIZE = (32, 24)
+
+    def __init__(self, threshold=SCENE_CHANGE_THRESHOLD, max_age=SCENE_GATE_MAX_AGE):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.thumb = np.empty(self.THUMB_SIZE[::-1], dtype=np.uint8)
+        self.diff = np.empty(self.THUMB_SIZE[::-1], dtype=np.uint8)
+        self.reset()
+
+    def reset(self):
+        self.reference = None   # Миниатюра кадра последнего опознания
+        self.reference_ts = 0.0
+        self.last_change = 0.0  # Последняя измеренная разность (для отладки)
+
+    def _make_thumb(self, rgb_small, dst):
+        small = cv2.resize(rgb_small, self.THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(small, cv2.COLOR_RGB2GRAY, dst=dst)
+        return dst
+
+    def remember(self, rgb_small):
+        """Запоминает кадр, на котором лицо успешно опознано."""
+        self.reference = self._make_thumb(rgb_small, np.empty_like(self.thumb))
+        self.reference_ts = time.monotonic()
+
+    def unchanged(self, rgb_small):
+        """True - сцена та же, можно переиспользовать прошлый результат."""
+        if self.reference is None:
+            return False
+        if time.monotonic() - self.reference_ts > self.max_age:
+            return False
+
+        self._make_thumb(rgb_small, self.thumb)
+        cv2.absdiff(self.thumb, self.reference, dst=self.diff)
+        self.last_change = float(cv2.mean(self.diff)[0])
+        if self.last_change > self.threshold:
+            # Значимое изменение - сразу полное распознавание
+            self.reference = None
+            return False
+        return True
+
+
+class FrameQualityGate:
+    """
+    Быстрая оценка пригодности кадра перед детекцией.
+
+    Работает на уже уменьшенном кадре (rgb_small):
+    - гистограмма яркости: слишком много темных или пересвеченных пикселей;
+    - резкость: дисперсия Лапласиана (смаз от движения, расфокус).
+    Стоит доли миллисекунды против десятков миллисекунд HOG + кодирования.
+    """
+
+    DARK = "dark"
+    OVEREXPOSED = "overexposed"
+    BLUR = "blur"
+
+    def __init__(self, dark_level=QUALITY_DARK_LEVEL, bright_level=QUALITY_BRIGHT_LEVEL,
+                 max_dark=QUALITY_MAX_DARK_RATIO, max_bright=QUALITY_MAX_BRIGHT_RATIO,
+                 min_sharpness=QUALITY_MIN_SHARPNESS):
+        self.dark_level = dark_level
+        self.bright_level = bright_level
+        self.max_dark = max_dark
+        self.max_bright = max_bright
+        self.min_sharpness = min_sharpness
+        self.counts = {self.DARK: 0, self.OVEREXPOSED: 0, self.BLUR: 0}
+
+    def check(self, rgb_small):
+        """None - кадр пригоден, иначе причина (dark / overexposed / blur)."""
+        gray = cv2.cvtColor(rgb_small, cv2.COLOR_RGB2GRAY)
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        total = gray.size
+
+        reason = None
+        if hist[:self.dark_level].sum() / total > self.max_dark:
+            reason = self.DARK
+        elif hist[self.bright_level:].sum() / total > self.max_bright:
+            reason = self.OVEREXPOSED
+        else:
+            _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+            if float(std[0, 0]) ** 2 < self.min_sharpness:
+                reason = self.BLUR
+
+        if reason is not None:
+            self.counts[reason] += 1
+        return reason
@@ -74,10 +74,14 @@ class IPCClient:
                 s.sendall(struct.pack('>I', len(msg_bytes)))
                 s.sendall(msg_bytes)
                 
-                # Ждем ответ
-                # Сначала читаем длину ответа, если сервис поддерживает такой протокол
-                # Но для простоты читаем буфер
-                response_data = s.recv(4096)
+                # Ждем ответ: сервис пишет JSON без заголовка длины и закрывает
+                # соединение, поэтому читаем до конца потока (ответ может быть > 4 КБ)
+                chunks = []
+                while True:
+                    chunk = s.recv(65536)
+                    if not chunk: break
+                    chunks.append(chunk)
+                response_data = b''.join(chunks)
                 if not response_data:
                     return {'status': 'error', 'message': 'Empty response'}
                 
@@ -107,4 +111,10 @@ class IPCClient:
         """
         Запрос текущего статуса (Авторизован/Нет).
         """
-        return self.send_command('GET_STATUS')
\ No newline at end of file
+        return self.send_command('GET_STATUS')
+
+    def get_metrics(self):
+        """
+        Гистограммы задержек этапов распознавания (p50/p95/p99).
+        """
+        return self.send_command('GET_METRICS')
\ No newline at end of file
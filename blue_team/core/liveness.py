@@ -0,0 +1,204 @@
+import time
+
+import cv2
+import numpy as np
+from collections import namedtuple
+
+from ..config import (
+    LIVENESS_CROP_SIZE, LIVENESS_CONFIDENCE, LIVENESS_MIN_FRAMES, LIVENESS_MAX_FRAMES
+)
+from .metrics import METRICS
+
+# Пороги физических проверок. Откалиброваны на кропе лица в исходном
+# разрешении камеры и измеряются на нем же (см. LivenessAnalyzer).
+GLARE_V_THRESHOLD = 250     # Яркость (V) жесткого блика
+GLARE_MAX_RATIO = 0.01      # > 1% лица в блике - стекло/экран
+SKIN_YCRCB_MIN = np.array([0, 133, 77], dtype=np.uint8)
+SKIN_YCRCB_MAX = np.array([255, 173, 127], dtype=np.uint8)
+SKIN_MIN_RATIO = 0.50       # < 50% пикселей похожи на кожу - подделка
+TEXTURE_MIN_VAR = 80        # Слишком мыльно (бумага/фото)
+TEXTURE_MAX_VAR = 1200      # Слишком резко (пиксельная сетка экрана)
+
+
+class LivenessScore(namedtuple('LivenessScore', ['glare_ratio', 'skin_ratio', 'focus'])):
+    """
+    Результат анализа живости одного лица.
+    Хранит сырые метрики; вердикты вычисляются по порогам модуля.
+    """
+    __slots__ = ()
+
+    @property
+    def glare_ok(self):
+        return self.glare_ratio <= GLARE_MAX_RATIO
+
+    @property
+    def skin_ok(self):
+        return self.skin_ratio >= SKIN_MIN_RATIO
+
+    @property
+    def texture_ok(self):
+        return TEXTURE_MIN_VAR <= self.focus <= TEXTURE_MAX_VAR
+
+    @property
+    def is_live(self):
+        return self.glare_ok and self.skin_ok and self.texture_ok
+
+    @property
+    def reason(self):
+        """Первая проваленная проверка (в порядке блики -> кожа -> текстура)."""
+        if not self.glare_ok:
+            return f"Блик стекла ({self.glare_ratio:.3f})"
+        if not self.skin_ok:
+            return f"Неестественный спектр кожи ({self.skin_ratio:.2f})"
+        if self.focus < TEXTURE_MIN_VAR:
+            return f"Размытая текстура (Бумага/Фото) Val:{self.focus:.0f}"
+        if self.focus > TEXTURE_MAX_VAR:
+            return f"Пиксельная сетка (Экран) Val:{self.focus:.0f}"
+        return "OK"
+
+
+class LivenessAnalyzer:
+    """
+    Единый проход анализа живости (блики + спектр кожи + текстура).
+
+    - Блики: канал V из HSV - это max(B, G, R), поэтому HSV не строится.
+    - Кожа: доля пикселей YCrCb в диапазоне кожи.
+    - Текстура: дисперсия Лапласиана по GRAY в float32.
+
+    Все три метрики считаются на исходном кропе: пороги откалиброваны
+    в исходном разрешении, а приведение к одному размеру меняет метрики
+    (дисперсия Лапласиана зависит от масштаба, INTER_AREA усредняет блики
+    и шум и завышает долю кожи). Промежуточные изображения пишутся в
+    буферы анализатора (dst=): они выделяются под crop_size и растут
+    только при кропе большей площади.
+
+    Экземпляр не потокобезопасен: каждому потоку нужен свой анализатор.
+    """
+
+    def __init__(self, crop_size=LIVENESS_CROP_SIZE):
+        w, h = crop_size
+        self._alloc(w * h)
+
+    def _alloc(self, pixels):
+        self.capacity = pixels
+        self.value = np.empty(pixels, dtype=np.uint8)
+        self.mask = np.empty(pixels, dtype=np.uint8)
+        self.ycrcb = np.empty(pixels * 3, dtype=np.uint8)
+        self.gray = np.empty(pixels, dtype=np.uint8)
+        self.laplacian = np.empty(pixels, dtype=np.float32)
+
+    def _views(self, h, w):
+        """Буферы под кроп h x w (перевыделение только при росте площади)."""
+        n = h * w
+        if n > self.capacity:
+            self._alloc(n)
+        return (self.value[:n].reshape(h, w), self.mask[:n].reshape(h, w),
+                self.ycrcb[:n * 3].reshape(h, w, 3), self.gray[:n].reshape(h, w),
+                self.laplacian[:n].reshape(h, w))
+
+    def analyze(self, face_bgr):
+        """Анализирует BGR-кроп лица и возвращает LivenessScore."""
+        t0 = time.perf_counter()
+        h, w = face_bgr.shape[:2]
+        total = h * w
+        value, mask, ycrcb, gray, laplacian = self._views(h, w)
+
+        # 1. Блики: V = max(B, G, R)
+        t1 = time.perf_counter()
+        np.max(face_bgr, axis=2, out=value)
+        cv2.threshold(value, GLARE_V_THRESHOLD, 255, cv2.THRESH_BINARY, dst=mask)
+        glare_ratio = cv2.countNonZero(mask) / total
+
+        # 2. Спектр кожи (YCrCb)
+        t2 = time.perf_counter()
+        cv2.cvtColor(face_bgr, cv2.COLOR_BGR2YCrCb, dst=ycrcb)
+        cv2.inRange(ycrcb, SKIN_YCRCB_MIN, SKIN_YCRCB_MAX, dst=mask)
+        skin_ratio = cv2.countNonZero(mask) / total
+
+        # 3. Текстура: дисперсия Лапласиана по GRAY
+        t3 = time.perf_counter()
+        cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY, dst=gray)
+        cv2.Laplacian(gray, cv2.CV_32F, dst=laplacian)
+        _, std = cv2.meanStdDev(laplacian)
+        focus = float(std[0, 0]) ** 2
+        t4 = time.perf_counter()
+
+        METRICS.record('liveness.buffers', t1 - t0)
+        METRICS.record('liveness.glare', t2 - t1)
+        METRICS.record('liveness.skin', t3 - t2)
+        METRICS.record('liveness.texture', t4 - t3)
+        return LivenessScore(glare_ratio, skin_ratio, focus)
+
+
+class SequentialLivenessTest:
+    """
+    Последовательный тест Вальда (SPRT) для проверки живости.
+
+    Каждый кадр дает "лог-отношение правдоподобия" живое/подделка,
+    вычисленное по запасу до порогов трех проверок: уверенно чистый кадр
+    дает большой плюс, пограничный - около нуля, явная подделка - минус.
+    Как и в обычном режиме, проваленная проверка не компенсируется
+    пройденными: если хоть одна проверка не пройдена, кадр дает сумму
+    только отрицательных вкладов, иначе - вклад самой слабой проверки.
+    Сумма накапливается, пока не пересечет одну из границ:
+        +log(c / (1 - c)) -> живое лицо,
+        -log(c / (1 - c)) -> подделка,
+    где c - требуемая уверенность. Решение не принимается раньше
+    min_frames кадров с лицом; по исчерпании max_frames тест считается
+    неокончательным (доступ не выдается).
+    """
+
+    # Вклад одной проверки в LLR ограничен, чтобы один кадр-выброс
+    # не решал исход теста в одиночку
+    CHECK_LLR_CAP = 3.0
+    # Крутизна перевода нормированного запаса в LLR
+    CHECK_LLR_GAIN = 4.0
+
+    def __init__(self, confidence=LIVENESS_CONFIDENCE, min_frames=LIVENESS_MIN_FRAMES,
+                 max_frames=LIVENESS_MAX_FRAMES):
+        confidence = min(max(confidence, 0.5 + 1e-6), 1.0 - 1e-6)
+        self.upper = float(np.log(confidence / (1.0 - confidence)))
+        self.lower = -self.upper
+        self.min_frames = max(1, min_frames)
+        self.max_frames = max(self.min_frames, max_frames)
+        self.llr = 0.0
+        self.frames = 0
+
+    def frame_llr(self, score):
+        """Вклад одного кадра по ограниченным запасам трех проверок."""
+        # Доля блика: 0 -> +1, порог -> 0, двойной порог -> -1
+        glare_margin = 1.0 - score.glare_ratio / GLARE_MAX_RATIO
+        # Доля кожи относительно порога 50%
+        skin_margin = (score.skin_ratio - SKIN_MIN_RATIO) / SKIN_MIN_RATIO
+        # Текстура: запас до ближайшей границы коридора в логарифмической шкале
+        focus = max(score.focus, 1e-6)
+        half_band = 0.5 * np.log(TEXTURE_MAX_VAR / TEXTURE_MIN_VAR)
+        texture_margin = min(np.log(focus / TEXTURE_MIN_VAR), np.log(TEXTURE_MAX_VAR / focus)) / half_band
+
+        llrs = [
+            float(np.clip(self.CHECK_LLR_GAIN * m, -self.CHECK_LLR_CAP, self.CHECK_LLR_CAP))
+            for m in (glare_margin, skin_margin, texture_margin)
+        ]
+        failed = [x for x in llrs if x < 0]
+        if failed:
+            return sum(failed)
+        return min(llrs)
+
+    def add(self, score):
+        """
+        Добавляет кадр и возвращает решение:
+        True - живое лицо, False - подделка, None - нужно больше кадров.
+        """
+        self.llr += self.frame_llr(score)
+        self.frames += 1
+        return self.decision
+
+    @property
+    def decision(self):
+        if self.frames < self.min_frames:
+            return None
+        if self.llr >= self.upper:
+            return True
+        if self.llr <= self.lower:
+            return False
+        return None
@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+from ..config import METRICS_ENABLED
+
+# Верхние границы корзин гистограммы задержек (мс). Последняя корзина - "больше".
+BUCKET_BOUNDS_MS = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с фиксированными корзинами.
+
+    Запись - один bisect и инкремент, память не растет с числом замеров.
+    Перцентили оцениваются по верхней границе корзины (точность - шаг сетки),
+    для последней корзины берется максимум.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, ms):
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKET_BOUNDS_MS[i], self.max) if i < len(BUCKET_BOUNDS_MS) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'max_ms': round(self.max, 3),
+            'buckets': dict(zip([str(b) for b in BUCKET_BOUNDS_MS] + ['inf'], self.counts)),
+        }
+
+
+class _Span:
+    """Контекстный менеджер замера одного этапа (time.perf_counter)."""
+
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class MetricsRegistry:
+    """
+    Потокобезопасный набор гистограмм по именам этапов.
+
+    Использование:
+        with METRICS.span('auth.detect'):
+            ...
+        METRICS.record('liveness.detect', seconds)
+
+    Этапы из процессов пула замеряются внутри процесса и передаются
+    в основной процесс вместе с результатом (см. vision._detect_and_encode).
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._hist = {}
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        """Записывает длительность этапа (в секундах, как perf_counter)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self._hist.get(name)
+            if hist is None:
+                hist = self._hist[name] = LatencyHistogram()
+            hist.record(seconds * 1000.0)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {name: h.snapshot() for name, h in sorted(self._hist.items())}
+        return {'since': self.started, 'uptime_sec': round(time.time() - self.started, 1), 'stages': stages}
+
+    def reset(self):
+        with self._lock:
+            self._hist.clear()
+            self.started = time.time()
+
+    def dump(self, path):
+        """Сохраняет снимок метрик в JSON-файл."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+
+# Общий реестр процесса (сервис, VisionSystem, поток захвата)
+METRICS = MetricsRegistry()
@@ -0,0 +1,207 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import FRAME_SOURCES, CAMERA_FUSION
+from .sources import create_frame_source
+from .vision import VisionSystem
+
+FUSION_POLICIES = ("any", "all", "primary_fallback")
+
+
+class CameraWorker:
+    """
+    Одна камера группы: своя VisionSystem (захват, трекер, детектор)
+    и собственный поток, в котором выполняются все ее проверки.
+    """
+
+    def __init__(self, name, vision):
+        self.name = name
+        self.vision = vision
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"Camera[{name}]")
+        self.metrics = {
+            'checks': 0,            # Вызовов check_authorization
+            'authorized': 0,        # Из них с опознанным лицом
+            'busy_time': 0.0,       # Суммарное время проверок (сек)
+            'last_latency': 0.0,    # Последняя проверка (сек)
+            'max_latency': 0.0,
+            'first_ts': 0.0,        # Время первой и последней проверки (для частоты)
+            'last_ts': 0.0,
+        }
+
+    def submit(self, fn):
+        return self.executor.submit(fn)
+
+    def timed_check(self):
+        """check_authorization с учетом задержки и пропускной способности."""
+        t0 = time.perf_counter()
+        result = self.vision.check_authorization()
+        latency = time.perf_counter() - t0
+
+        m = self.metrics
+        m['checks'] += 1
+        m['authorized'] += int(bool(result))
+        m['busy_time'] += latency
+        m['last_latency'] = latency
+        m['max_latency'] = max(m['max_latency'], latency)
+        now = time.monotonic()
+        if not m['first_ts']:
+            m['first_ts'] = now
+        m['last_ts'] = now
+        return result
+
+    def get_stats(self):
+        m = dict(self.metrics)
+        span = m['last_ts'] - m['first_ts']
+        stats = self.vision.get_stats()
+        stats.update({
+            'checks': m['checks'],
+            'authorized': m['authorized'],
+            'checks_per_sec': round((m['checks'] - 1) / span, 2) if span > 0 else 0.0,
+            'avg_latency_ms': round(1000 * m['busy_time'] / m['checks'], 1) if m['checks'] else 0.0,
+            'last_latency_ms': round(1000 * m['last_latency'], 1),
+            'max_latency_ms': round(1000 * m['max_latency'], 1),
+            'signal': self.vision.has_signal(),
+        })
+        return stats
+
+
+class CameraGroup:
+    """
+    Несколько камер с единым интерфейсом VisionSystem.
+
+    Каждая камера работает в своем потоке (CameraWorker), проверки всех
+    камер выполняются параллельно, а результаты объединяются политикой
+    CAMERA_FUSION:
+    - "any": доступ, если сотрудник опознан хотя бы одной камерой;
+    - "all": доступ, только если опознание прошло на всех камерах
+      (камера без кадров считается отказом);
+    - "primary_fallback": решает основная (первая) камера, остальные
+      учитываются только пока основная не дает кадров.
+    Чужой или фейк в кадре любой камеры блокирует доступ при любой политике.
+
+    Галерея и пулы проверки живости общие: их держит основная камера.
+    """
+
+    def __init__(self, db_manager, sources, policy=CAMERA_FUSION):
+        if policy not in FUSION_POLICIES:
+            raise ValueError(f"Неизвестная политика объединения камер: {policy}")
+        self.policy = policy
+        self.workers = []
+        primary = None
+        for spec in sources:
+            vision = VisionSystem(db_manager, create_frame_source(spec), primary=primary)
+            primary = primary or vision
+            self.workers.append(CameraWorker(spec, vision))
+        self.primary = primary
+        print(f"[VISION] Камер: {len(self.workers)}, политика: {policy}")
+
+    # Интерфейс VisionSystem для SecurityService
+    # -------------------------------------------------------------------------
+
+    @property
+    def gallery(self):
+        return self.primary.gallery
+
+    @property
+    def last_match(self):
+        for w in self.workers:
+            if w.vision.last_match is not None:
+                return w.vision.last_match
+        return None
+
+    def update_cache(self):
+        self.primary.update_cache()
+        for w in self.workers[1:]:
+            w.vision.share_cache(self.primary)
+
+    def _run_all(self, fn_for_worker):
+        """Запускает fn на всех камерах параллельно и ждет результаты по порядку."""
+        futures = [w.submit(fn_for_worker(w)) for w in self.workers]
+        return [f.result() for f in futures]
+
+    def _fuse(self, results, ok):
+        """
+        Объединяет результаты камер по политике.
+        ok(result) -> bool: успешен ли результат одной камеры.
+        Возвращает индекс решающей камеры или None (отказ).
+        """
+        passed = [i for i, r in enumerate(results) if ok(r)]
+        if self.policy == "all":
+            return 0 if len(passed) == len(results) else None
+        if self.policy == "primary_fallback" and self.workers[0].vision.has_signal():
+            return 0 if 0 in passed else None
+        if self.policy == "primary_fallback":
+            passed = [i for i in passed if i > 0]
+        return passed[0] if passed else None
+
+    def check_authorization(self):
+        results = self._run_all(lambda w: w.timed_check)
+        if self._fuse(results, bool) is not None:
+            return True
+        # Все камеры дали только непригодные кадры - решение откладывается
+        if all(r is None for r in results):
+            return None
+        return False
+
+    def check_liveness_and_auth(self):
+        results = self._run_all(lambda w: w.vision.check_liveness_and_auth)
+        # Чужой или фейк на любой камере блокирует при любой политике;
+        # к другим камерам переходят только "нет лиц" и непригодные кадры
+        for w, (is_live, msg) in zip(self.workers, results):
+            if not is_live and w.vision.last_veto:
+                return False, f"{msg} [{w.name}]"
+        winner = self._fuse(results, lambda r: r[0])
+        if winner is not None:
+            return True, f"{results[winner][1]} [{self.workers[winner].name}]"
+        # Причина отказа - первой камеры, не прошедшей проверку
+        for w, (is_live, msg) in zip(self.workers, results):
+            if not is_live:
+                return False, f"{msg} [{w.name}]"
+        return False, "Отказ основной камеры"
+
+    def reset_tracking(self):
+        self._run_all(lambda w: w.vision.reset_tracking)
+
+    def warm_up(self):
+        # Прогрев идет в отдельных потоках, а не в потоках камер: проверки,
+        # отправленные во время прогрева, не ждут его в очереди. Общие пулы - основная
+        with ThreadPoolExecutor(max_workers=len(self.workers), thread_name_prefix="WarmUp") as executor:
+            return max(executor.map(lambda w: w.vision.warm_up(), self.workers))
+
+    def prepare_thread(self):
+        # Пред-детектор загружается в потоке каждой камеры - там идут проверки
+        self._run_all(lambda w: w.vision.prepare_thread)
+
+    def standby(self):
+        self._run_all(lambda w: w.vision.standby)
+
+    def set_allowed_roles(self, roles):
+        self._run_all(lambda w: lambda: w.vision.set_allowed_roles(roles))
+
+    def get_stats(self):
+        return {
+            'policy': self.policy,
+            'cameras': {w.name: w.get_stats() for w in self.workers},
+        }
+
+    def release(self):
+        self._run_all(lambda w: w.vision.release)
+
+    def close(self):
+        # Сначала вторичные камеры, затем основная: она закрывает общие пулы
+        for f in [w.submit(w.vision.close) for w in self.workers[1:]]:
+            f.result()
+        self.workers[0].submit(self.workers[0].vision.close).result()
+
+
+def create_vision(db_manager, sources=None):
+    """
+    VisionSystem для сервиса по config.FRAME_SOURCES:
+    одна камера - обычная VisionSystem, несколько - CameraGroup.
+    """
+    sources = list(FRAME_SOURCES if sources is None else sources)
+    if len(sources) > 1:
+        return CameraGroup(db_manager, sources)
+    if sources:
+        return VisionSystem(db_manager, create_frame_source(sources[0]))
+    return VisionSystem(db_manager)
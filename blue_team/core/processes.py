@@ -0,0 +1,465 @@
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import psutil
+
+from ..config import (
+    PROCESS_RESYNC_INTERVAL, PROCESS_WATCHER, PROCESS_POLL_INTERVAL
+)
+from .metrics import METRICS
+
+# Событие наблюдателя процессов: kind - START или EXIT, name - имя exe в нижнем регистре
+ProcessEvent = namedtuple('ProcessEvent', ['kind', 'pid', 'name'])
+START = "start"
+EXIT = "exit"
+
+
+class ProcessIndex:
+    """
+    Инкрементальная таблица процессов: PID -> имя exe (в нижнем регистре)
+    и дерево процессов (родитель -> дети).
+
+    Каждый refresh() берет только список PID (psutil.pids - без открытия
+    процессов), имена и родители запрашиваются лишь для новых PID,
+    завершившиеся удаляются. Совпадения с черным списком хранятся отдельно и
+    обновляются по тем же изменениям, поэтому стоимость такта зависит от
+    числа запущенных/завершенных процессов, а не от их общего числа.
+
+    PID может быть переиспользован системой между тактами - найденные
+    цели перепроверяются через psutil.Process.is_running (время создания),
+    а вся таблица пересобирается раз в resync_interval секунд.
+    """
+
+    def __init__(self, resync_interval=PROCESS_RESYNC_INTERVAL):
+        self.resync_interval = resync_interval
+        self.names = {}         # PID -> имя exe ('' - имя недоступно)
+        self.ctimes = {}        # PID -> время создания процесса (0.0 - недоступно)
+        self.parents = {}       # PID -> PID родителя
+        self.children = {}      # PID -> множество PID дочерних процессов
+        self.targets = frozenset()
+        self.matches = {}       # PID -> psutil.Process целевых процессов
+        self._targets_key = ()
+        self._last_resync = 0.0
+        self.stats = {
+            'refreshes': 0,     # Вызовов refresh
+            'resolved': 0,      # Запросов имени (новые PID)
+            'exited': 0,        # Удалено завершившихся PID
+            'resyncs': 0,       # Полных пересборок
+        }
+
+    def set_targets(self, targets):
+        """Задает список имен exe. Совпадения пересчитываются по кэшу имен, без psutil."""
+        key = tuple(targets)
+        if key == self._targets_key: return
+        self._targets_key = key
+        self.targets = frozenset(t.lower() for t in targets)
+        matches = {}
+        for pid, name in self.names.items():
+            if name in self.targets:
+                matches[pid] = self.matches.get(pid) or self._open(pid)
+        self.matches = {pid: p for pid, p in matches.items() if p is not None}
+
+    @staticmethod
+    def _open(pid):
+        try:
+            return psutil.Process(pid)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+    def _resolve(self, pid):
+        """(имя, psutil.Process или None). Время создания запоминается в ctimes."""
+        self.stats['resolved'] += 1
+        proc = self._open(pid)
+        if proc is None:
+            return '', None
+        try:
+            name = proc.name().lower()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, ValueError):
+            return '', None
+        try:
+            self.ctimes[pid] = proc.create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return name, proc
+
+    @staticmethod
+    def _parent_pids(pids):
+        """
+        PID -> PID родителя для новых процессов.
+        В Windows psutil.Process.ppid() каждый раз снимает таблицу всех
+        процессов, поэтому там берется один снимок на refresh
+        (psutil._ppid_map - тот же, что в Process.children). В остальных
+        ОС ppid() читает только сам процесс.
+        """
+        ppid_map = getattr(psutil, '_ppid_map', None) if psutil.WINDOWS else None
+        if ppid_map is not None:
+            try:
+                full = ppid_map()
+                return {pid: full[pid] for pid in pids if pid in full}
+            except Exception:
+                pass
+        found = {}
+        for pid in pids:
+            try:
+                found[pid] = psutil.Process(pid).ppid()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return found
+
+    def _forget(self, pid):
+        self.names.pop(pid, None)
+        self.ctimes.pop(pid, None)
+        self.matches.pop(pid, None)
+        ppid = self.parents.pop(pid, None)
+        if ppid in self.children:
+            self.children[ppid].discard(pid)
+        # Дети завершившегося процесса остаются в таблице без связи с ним
+        self.children.pop(pid, None)
+
+    def refresh(self):
+        """
+        Обновляет таблицу по текущему списку PID.
+
+        Returns:
+            (started, exited) - множества PID, появившихся и завершившихся с прошлого вызова.
+        """
+        with METRICS.span('process.scan'):
+            now = time.monotonic()
+            if now - self._last_resync > self.resync_interval:
+                # Полная пересборка - имена всех PID запрашиваются заново
+                self._last_resync = now
+                self.stats['resyncs'] += 1
+                old = set(self.names)
+                self.names, self.ctimes, self.parents, self.children = {}, {}, {}, {}
+                self.matches = {}
+            else:
+                old = None
+            self.stats['refreshes'] += 1
+
+            current = set(psutil.pids())
+            exited = set(self.names).difference(current)
+            started = current.difference(self.names)
+            for pid in exited:
+                self._forget(pid)
+            self.stats['exited'] += len(exited)
+
+            for pid in started:
+                name, proc = self._resolve(pid)
+                self.names[pid] = name
+                if name in self.targets and proc is not None:
+                    self.matches[pid] = proc
+
+            if started:
+                for pid, ppid in self._parent_pids(started).items():
+                    if ppid == pid: continue  # System Idle Process (PID 0) - сам себе родитель
+                    self.parents[pid] = ppid
+                    self.children.setdefault(ppid, set()).add(pid)
+
+            if old is not None:
+                # После пересборки изменения считаются относительно прежней таблицы
+                started, exited = current - old, old - current
+        return started, exited
+
+    def running_targets(self):
+        """PID -> имя exe запущенных целевых процессов (по состоянию на последний refresh)."""
+        found = {}
+        for pid, proc in list(self.matches.items()):
+            if proc.is_running():
+                found[pid] = self.names[pid]
+            else:
+                # PID завершился или переиспользован - имя определится заново
+                self._forget(pid)
+        return found
+
+    def tree(self, pids):
+        """
+        PID и все их потомки (по индексу родитель -> дети, без psutil).
+        Потомок, созданный раньше "родителя", пропускается: это значит,
+        что PID родителя уже переиспользован другим процессом.
+        """
+        result = set()
+        stack = list(pids)
+        while stack:
+            pid = stack.pop()
+            if pid in result: continue
+            result.add(pid)
+            ctime = self.ctimes.get(pid, 0.0)
+            for child in self.children.get(pid, ()):
+                if self.ctimes.get(child, ctime) >= ctime:
+                    stack.append(child)
+        return result
+
+
+class ProcessWatcher:
+    """
+    Источник событий запуска/завершения целевых процессов.
+
+    Механизм событий (WMI, netlink) работает в фоновом потоке и кладет
+    события в очередь; wait() блокирует вызывающий поток до события,
+    wake() или таймаута. События по процессам не из черного списка
+    отбрасываются сразу.
+    """
+
+    name = "events"
+
+    def __init__(self):
+        self.targets = frozenset()
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=1024)
+        self._woken = False
+        self._running = False
+        self._known = {}  # PID -> имя запущенных целевых процессов (для EXIT без имени)
+
+    @property
+    def alive(self):
+        return self._running
+
+    def set_targets(self, targets):
+        self.targets = frozenset(t.lower() for t in targets)
+
+    def start(self) -> bool:
+        self._running = True
+        return True
+
+    def stop(self):
+        self._running = False
+        self.wake()
+
+    def wake(self):
+        """Прерывает текущий (или ближайший) wait() без события."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+
+    def _emit(self, kind, pid, name=None):
+        if kind == START:
+            if name not in self.targets: return
+            self._known[pid] = name
+        else:
+            name = self._known.pop(pid, name)
+            if name not in self.targets: return
+        with self._cond:
+            self._events.append(ProcessEvent(kind, pid, name))
+            self._cond.notify_all()
+
+    def _wait_once(self, timeout):
+        with self._cond:
+            if not self._events and not self._woken and timeout > 0:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            woken, self._woken = self._woken, False
+        return events, woken
+
+    def wait(self, timeout):
+        """
+        Ждет события не дольше timeout секунд.
+
+        Returns:
+            список ProcessEvent (пустой - таймаут или wake()).
+        """
+        return self._wait_once(timeout)[0]
+
+
+class PollingProcessWatcher(ProcessWatcher):
+    """
+    Запасной вариант без событий ОС: опрос ProcessIndex каждые interval
+    секунд внутри wait() (в потоке вызывающего, фонового потока нет).
+    """
+
+    name = "polling"
+
+    def __init__(self, index, interval=PROCESS_POLL_INTERVAL):
+        super().__init__()
+        self.index = index
+        self.interval = interval
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            started, exited = self.index.refresh()
+            for pid in started:
+                self._emit(START, pid, self.index.names.get(pid))
+            for pid in exited:
+                self._emit(EXIT, pid)
+            remaining = deadline - time.monotonic()
+            events, woken = self._wait_once(min(self.interval, remaining))
+            if events or woken or remaining <= self.interval:
+                return events
+
+
+class WmiProcessWatcher(ProcessWatcher):
+    """
+    Windows: подписка WMI на Win32_ProcessStartTrace / Win32_ProcessStopTrace
+    (события ядра о запуске и завершении процессов, нужны права администратора).
+    Каждая подписка - в своем потоке со своей инициализацией COM.
+    """
+
+    name = "wmi"
+
+    # NextEvent ждет не дольше (мс) - чтобы поток замечал остановку
+    POLL_MS = 500
+    # HRESULT wbemErrTimedOut: событий за время ожидания не было
+    WBEM_E_TIMED_OUT = -2147209215
+
+    def __init__(self):
+        super().__init__()
+        self._threads = []
+
+    def start(self):
+        self._running = True
+        ready = []
+        for wmi_class, kind in (("Win32_ProcessStartTrace", START), ("Win32_ProcessStopTrace", EXIT)):
+            subscribed = threading.Event()
+            t = threading.Thread(target=self._trace_loop, args=(wmi_class, kind, subscribed, ready),
+                                 name=f"WMI[{kind}]", daemon=True)
+            t.start()
+            subscribed.wait(timeout=5.0)
+            self._threads.append(t)
+        if len(ready) < 2:
+            self.stop()
+            return False
+        return True
+
+    def _trace_loop(self, wmi_class, kind, subscribed, ready):
+        import pythoncom
+        import pywintypes
+        import win32com.client
+
+        pythoncom.CoInitialize()
+        try:
+            try:
+                wmi = win32com.client.GetObject(r"winmgmts:{impersonationLevel=impersonate}!\\.\root\cimv2")
+                events = wmi.ExecNotificationQuery(f"SELECT ProcessID, ProcessName FROM {wmi_class}")
+                ready.append(wmi_class)
+            except Exception as e:
+                print(f"[SYSTEM] Подписка WMI {wmi_class} недоступна: {e}")
+                return
+            finally:
+                subscribed.set()
+
+            while self._running:
+                try:
+                    ev = events.NextEvent(self.POLL_MS)
+                except pywintypes.com_error as e:
+                    if e.excepinfo and e.excepinfo[5] == self.WBEM_E_TIMED_OUT:
+                        continue
+                    print(f"[SYSTEM] Ошибка подписки WMI {wmi_class}: {e}")
+                    break
+                self._emit(kind, int(ev.ProcessID), str(ev.ProcessName).lower())
+        finally:
+            # Поток событий упал - SystemController перейдет на опрос
+            self._running = False
+            pythoncom.CoUninitialize()
+
+
+class NetlinkProcessWatcher(ProcessWatcher):
+    """
+    Linux: netlink proc connector (события PROC_EVENT_EXEC / PROC_EVENT_EXIT
+    от ядра). Подписка требует CAP_NET_ADMIN (root).
+    """
+
+    name = "netlink"
+
+    NETLINK_CONNECTOR = 11
+    CN_IDX_PROC = 1
+    CN_VAL_PROC = 1
+    PROC_CN_MCAST_LISTEN = 1
+    NLMSG_DONE = 3
+    PROC_EVENT_EXEC = 0x00000002
+    PROC_EVENT_EXIT = 0x80000000
+
+    # nlmsghdr (len, type, flags, seq, pid) и cn_msg (idx, val, seq, ack, len, flags)
+    NLMSG_HDR = struct.Struct("=IHHII")
+    CN_MSG = struct.Struct("=IIIIHH")
+    # proc_event: what, cpu, timestamp_ns; далее pid и tgid процесса
+    PROC_EVENT = struct.Struct("=IIQII")
+
+    def __init__(self):
+        super().__init__()
+        self._sock = None
+        self._thread = None
+
+    def start(self):
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, self.NETLINK_CONNECTOR)
+            sock.bind((0, self.CN_IDX_PROC))
+            payload = struct.pack("=I", self.PROC_CN_MCAST_LISTEN)
+            cn = self.CN_MSG.pack(self.CN_IDX_PROC, self.CN_VAL_PROC, 0, 0, len(payload), 0)
+            size = self.NLMSG_HDR.size + len(cn) + len(payload)
+            sock.send(self.NLMSG_HDR.pack(size, self.NLMSG_DONE, 0, 0, 0) + cn + payload)
+            sock.settimeout(0.5)
+        except (OSError, AttributeError) as e:
+            print(f"[SYSTEM] Netlink proc connector недоступен: {e}")
+            return False
+        self._sock = sock
+        self._running = True
+        self._thread = threading.Thread(target=self._recv_loop, name="Netlink[proc]", daemon=True)
+        self._thread.start()
+        return True
+
+    def _recv_loop(self):
+        header = self.NLMSG_HDR.size + self.CN_MSG.size
+        try:
+            while self._running:
+                try:
+                    data = self._sock.recv(4096)
+                except socket.timeout:
+                    continue
+                offset = 0
+                while offset + header + self.PROC_EVENT.size <= len(data):
+                    msg_len = self.NLMSG_HDR.unpack_from(data, offset)[0]
+                    what, _, _, pid, tgid = self.PROC_EVENT.unpack_from(data, offset + header)
+                    # Потоки (pid != tgid) не интересны - только процессы
+                    if pid == tgid:
+                        if what == self.PROC_EVENT_EXEC:
+                            self._emit(START, tgid, self._name(tgid))
+                        elif what == self.PROC_EVENT_EXIT:
+                            self._emit(EXIT, tgid)
+                    if msg_len <= 0: break
+                    offset += (msg_len + 3) & ~3
+        except OSError as e:
+            print(f"[SYSTEM] Ошибка netlink proc connector: {e}")
+        finally:
+            self._running = False
+            self._sock.close()
+
+    @staticmethod
+    def _name(pid):
+        try:
+            return psutil.Process(pid).name().lower()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return None
+
+
+def create_process_watcher(index, kind=PROCESS_WATCHER):
+    """
+    Наблюдатель процессов по config.PROCESS_WATCHER.
+    Если механизм событий недоступен - опрос ProcessIndex.
+    """
+    if kind == "auto":
+        if sys.platform == "win32":
+            kind = "wmi"
+        elif sys.platform.startswith("linux") and hasattr(os, "geteuid") and os.geteuid() == 0:
+            kind = "netlink"
+        else:
+            kind = "polling"
+
+    watcher = {"wmi": WmiProcessWatcher, "netlink": NetlinkProcessWatcher}.get(kind)
+    if watcher is not None:
+        watcher = watcher()
+        if watcher.start():
+            print(f"[SYSTEM] Наблюдение за процессами: {watcher.name}")
+            return watcher
+    elif kind != "polling":
+        raise ValueError(f"Неизвестный механизм наблюдения за процессами: {kind}")
+
+    print("[SYSTEM] Наблюдение за процессами: опрос")
+    watcher = PollingProcessWatcher(index)
+    watcher.start()
+    return watcher
@@ -0,0 +1,243 @@
+import os
+import time
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from ..config import (
+    CAMERA_INDEX, CAMERA_BACKEND, FRAME_SOURCE, FRAME_SOURCE_REALTIME, FRAME_SOURCE_FPS
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameSource(ABC):
+    """
+    Источник кадров для VisionSystem.
+
+    Интерфейс повторяет cv2.VideoCapture (open/isOpened/read/release),
+    поэтому FrameGrabber одинаково работает с камерой, файлами и генератором.
+
+    live = True  - "живой" источник: при сбое чтения его нужно переоткрыть.
+    live = False - конечный источник: сбой чтения означает конец потока.
+    realtime     - отдавать кадры с исходной частотой (True)
+                   или так быстро, как их забирают (False). Конечный
+                   источник без realtime FrameGrabber читает без потерь:
+                   каждый кадр доходит до анализа.
+    """
+
+    live = False
+
+    def __init__(self, realtime=True, fps=FRAME_SOURCE_FPS):
+        self.realtime = realtime
+        self.fps = fps
+        self._next_ts = 0.0
+
+    @abstractmethod
+    def open(self) -> bool:
+        ...
+
+    @abstractmethod
+    def isOpened(self) -> bool:
+        ...
+
+    @abstractmethod
+    def read(self):
+        ...
+
+    def release(self):
+        pass
+
+    def _pace(self):
+        """Задержка до времени следующего кадра в режиме реального времени."""
+        if not self.realtime or self.fps <= 0:
+            return
+        now = time.monotonic()
+        if self._next_ts > now:
+            time.sleep(self._next_ts - now)
+        self._next_ts = max(now, self._next_ts) + 1.0 / self.fps
+
+
+class CameraSource(FrameSource):
+    """Веб-камера. Бэкенд захвата (DSHOW/MSMF/V4L2/ANY) - свойство источника."""
+
+    live = True
+
+    def __init__(self, index=CAMERA_INDEX, backend=CAMERA_BACKEND):
+        super().__init__(realtime=False)
+        self.index = index
+        self.backend = getattr(cv2, f"CAP_{backend.upper()}", cv2.CAP_ANY)
+        self.cap = None
+
+    def open(self):
+        self.release()
+        self.cap = cv2.VideoCapture(self.index, self.backend)
+        return self.cap.isOpened()
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        if self.cap is None: return False, None
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoFileSource(FrameSource):
+    """Видеофайл. В реальном времени кадры отдаются с FPS самого файла."""
+
+    def __init__(self, path, realtime=FRAME_SOURCE_REALTIME, loop=False):
+        super().__init__(realtime=realtime)
+        self.path = str(path)
+        self.loop = loop
+        self.cap = None
+
+    def open(self):
+        self.release()
+        self.cap = cv2.VideoCapture(self.path)
+        file_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if file_fps and file_fps > 0:
+            self.fps = file_fps
+        self._next_ts = 0.0
+        return self.cap.isOpened()
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self):
+        if self.cap is None: return False, None
+        self._pace()
+        ret, frame = self.cap.read()
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageFolderSource(FrameSource):
+    """Папка с кадрами (jpg/png/bmp) в алфавитном порядке."""
+
+    def __init__(self, path, realtime=FRAME_SOURCE_REALTIME, fps=FRAME_SOURCE_FPS, loop=False):
+        super().__init__(realtime=realtime, fps=fps)
+        self.path = str(path)
+        self.loop = loop
+        self.files = []
+        self.pos = 0
+
+    def open(self):
+        try:
+            names = sorted(os.listdir(self.path))
+        except OSError:
+            return False
+        self.files = [os.path.join(self.path, n) for n in names if n.lower().endswith(IMAGE_EXTENSIONS)]
+        self.pos = 0
+        self._next_ts = 0.0
+        return bool(self.files)
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self.files:
+            if self.pos >= len(self.files):
+                if not self.loop: return False, None
+                self.pos = 0
+            path = self.files[self.pos]
+            self.pos += 1
+            frame = cv2.imread(path)
+            if frame is not None:
+                self._pace()
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.files = []
+
+
+class SyntheticSource(FrameSource):
+    """
+    Синтетический генератор кадров (без камеры и файлов).
+
+    Фон - шум с медленно меняющейся освещенностью. Если задан sprite
+    (путь к фото лица), он плавно перемещается по кадру - этого достаточно
+    для профилирования детекции и опознания на сервере сборки.
+    """
+
+    def __init__(self, width=640, height=480, sprite=None, count=0,
+                 realtime=FRAME_SOURCE_REALTIME, fps=FRAME_SOURCE_FPS, seed=0):
+        super().__init__(realtime=realtime, fps=fps)
+        self.width = width
+        self.height = height
+        self.sprite_path = sprite
+        self.count = count  # 0 = бесконечно
+        self.seed = seed
+        self.sprite = None
+        self.frame_no = 0
+        self._opened = False
+
+    def open(self):
+        self.rng = np.random.default_rng(self.seed)
+        self.base = self.rng.integers(40, 200, (self.height, self.width, 3), dtype=np.uint8)
+        if self.sprite_path:
+            self.sprite = cv2.imread(str(self.sprite_path))
+        self.frame_no = 0
+        self._next_ts = 0.0
+        self._opened = True
+        return True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened: return False, None
+        if self.count and self.frame_no >= self.count: return False, None
+        self._pace()
+
+        t = self.frame_no
+        self.frame_no += 1
+        gain = 0.85 + 0.15 * np.sin(t / 25.0)
+        frame = cv2.convertScaleAbs(self.base, alpha=gain)
+
+        if self.sprite is not None:
+            sh, sw = self.sprite.shape[:2]
+            sh, sw = min(sh, self.height), min(sw, self.width)
+            x = int((self.width - sw) * (0.5 + 0.4 * np.sin(t / 40.0)))
+            y = int((self.height - sh) * (0.5 + 0.2 * np.cos(t / 55.0)))
+            frame[y:y + sh, x:x + sw] = self.sprite[:sh, :sw]
+        return True, frame
+
+    def release(self):
+        self._opened = False
+
+
+def create_frame_source(spec=FRAME_SOURCE):
+    """
+    Создает источник кадров по строке из config.FRAME_SOURCE:
+        "camera"          - камера CAMERA_INDEX
+        "camera:<index>"  - камера с указанным индексом
+        "video:<path>"    - видеофайл
+        "images:<path>"   - папка с изображениями
+        "synthetic"       - генератор (или "synthetic:<путь_к_фото_лица>")
+    """
+    kind, _, arg = spec.partition(':')
+    kind = kind.strip().lower()
+
+    if kind == "camera":
+        return CameraSource(int(arg) if arg else CAMERA_INDEX)
+    if kind == "video":
+        return VideoFileSource(arg)
+    if kind == "images":
+        return ImageFolderSource(arg)
+    if kind == "synthetic":
+        return SyntheticSource(sprite=arg or None)
+    raise ValueError(f"Неизвестный источник кадров: {spec}")
@@ -4,9 +4,37 @@ import win32con
 import win32process
 import os
 import sys
+import time
 import winreg # Для работы с реестром
 import ctypes # Для обновления иконок
 
+from .processes import ProcessIndex, PollingProcessWatcher, create_process_watcher
+
+
+class WindowSnapshot:
+    """
+    Снимок окон верхнего уровня за один проход EnumWindows: PID -> список HWND.
+
+    Берется один раз на пакет блокировки, поэтому число вызовов EnumWindows
+    не растет с числом защищаемых процессов.
+    """
+
+    def __init__(self):
+        self.by_pid = {}
+        def callback(hwnd, _):
+            try:
+                _, pid = win32process.GetWindowThreadProcessId(hwnd)
+                if win32gui.IsWindowVisible(hwnd) or win32gui.IsWindowEnabled(hwnd):
+                    self.by_pid.setdefault(pid, []).append(hwnd)
+            except: pass
+            return True
+        try: win32gui.EnumWindows(callback, None)
+        except: pass
+
+    def windows_for(self, pid: int) -> list:
+        return list(self.by_pid.get(pid, ()))
+
+
 class SystemController:
     """
     Контроллер операционной системы.
@@ -16,86 +44,129 @@ class SystemController:
     3. Настройку ассоциаций файлов в реестре.
     """
 
-    def __init__(self):
+    def __init__(self, watch_processes=True):
         # Словарь: PID -> Список HWND (всех окон этого процесса)
         self.blocked_windows = {} 
         # Множество замороженных PID
         self.suspended_pids = set()
+        # Кэш PID -> имя exe, обновляется только по изменениям списка процессов
+        self.process_index = ProcessIndex()
+        # События запуска/завершения целевых процессов: подписка на события ОС
+        # оформляется при создании контроллера, а не внутри первого ожидания
+        self.process_watcher = create_process_watcher(self.process_index) if watch_processes else None
 
     # =========================================================================
     # УПРАВЛЕНИЕ ПРОЦЕССАМИ И ОКНАМИ
     # =========================================================================
 
-    def get_running_processes_by_name(self, targets: list) -> list:
-        """Ищет PID запущенных процессов из списка имен."""
-        found_pids = set()
-        targets_exe = {t.lower() for t in targets}
-        targets_clean = {t.lower().replace(".exe", "") for t in targets}
+    def find_running_targets(self, targets: list) -> dict:
+        """PID -> имя exe (в нижнем регистре) запущенных процессов из списка."""
+        index = self.process_index
+        try:
+            index.set_targets(targets)
+            index.refresh()
+            return index.running_targets()
+        except Exception:
+            return {}
+
+    def expand_process_trees(self, pids) -> list:
+        """
+        PID вместе со всеми дочерними процессами (браузеры, Electron, надстройки
+        Office запускают окна в детях с другими именами exe). Дерево берется
+        из индекса процессов, обновленного последним find_running_targets.
+        """
+        if not pids: return []
+        return list(self.process_index.tree(pids))
+
+    def wait_for_process_event(self, targets: list, timeout: float) -> list:
+        """
+        Ждет запуска или завершения процесса из списка не дольше timeout секунд.
+        Раньше таймаута ожидание прерывает и wake().
 
-        # 1. Поиск по списку процессов (psutil)
+        Returns:
+            список ProcessEvent (пустой - таймаут или wake()).
+        """
+        watcher = self.process_watcher
+        if watcher is None or not watcher.alive:
+            if watcher is not None:
+                print(f"[SYSTEM] Наблюдение за процессами ({watcher.name}) остановлено, переход на опрос")
+            watcher = self.process_watcher = PollingProcessWatcher(self.process_index)
+            watcher.start()
         try:
-            for proc in psutil.process_iter(['pid', 'name']):
-                try:
-                    if proc.info['name'].lower() in targets_exe:
-                        found_pids.add(proc.info['pid'])
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-        except Exception: pass
-
-        # 2. Поиск по окнам (WinAPI) - быстрее находит GUI приложения
-        def enum_fast_callback(hwnd, _):
-            if win32gui.IsWindowVisible(hwnd):
-                try:
-                    _, pid = win32process.GetWindowThreadProcessId(hwnd)
-                    if pid in found_pids: return True # Уже нашли
-                    
-                    # Можно добавить проверку заголовка, если нужно
-                except: pass
-            return True
-        
-        # (Опционально можно включить перебор окон, но psutil обычно хватает)
-        return list(found_pids)
+            watcher.set_targets(targets)
+            return watcher.wait(timeout)
+        except Exception as e:
+            print(f"[SYSTEM] Ошибка ожидания событий процессов: {e}")
+            time.sleep(timeout)
+            return []
 
-    def _get_all_windows_for_pid(self, pid: int):
-        hwnds = []
-        def callback(hwnd, _):
-            _, found_pid = win32process.GetWindowThreadProcessId(hwnd)
-            if found_pid == pid:
-                if win32gui.IsWindowVisible(hwnd) or win32gui.IsWindowEnabled(hwnd):
-                    hwnds.append(hwnd)
-            return True
-        try: win32gui.EnumWindows(callback, None)
-        except: pass
-        return hwnds
+    def wake(self):
+        """Прерывает wait_for_process_event (например, по сигналу Редактора)."""
+        if self.process_watcher is not None:
+            self.process_watcher.wake()
 
     def block_process_window(self, pid: int):
         """Блокировка: Свернуть окна -> Скрыть -> Заморозить процесс."""
-        if pid in self.suspended_pids: return
+        self.block_processes([pid])
 
-        windows = self._get_all_windows_for_pid(pid)
-        if windows:
-            self.blocked_windows[pid] = windows
-            
-            # Убираем фокус
+    def block_processes(self, pids, snapshot=None) -> list:
+        """
+        Блокировка набора процессов по одному снимку окон (WindowSnapshot).
+        Уже замороженные PID пропускаются без перебора окон.
+
+        Returns:
+            список PID, замороженных этим вызовом.
+        """
+        pending = [pid for pid in pids if pid not in self.suspended_pids]
+        if not pending: return []
+        if snapshot is None:
+            snapshot = WindowSnapshot()
+        targets = {pid: snapshot.windows_for(pid) for pid in pending}
+
+        # Убираем фокус (один раз на весь пакет)
+        all_windows = {hwnd for windows in targets.values() for hwnd in windows}
+        if all_windows:
             fg = win32gui.GetForegroundWindow()
-            if fg in windows:
+            if fg in all_windows:
                 try: win32gui.SetForegroundWindow(win32gui.GetDesktopWindow())
                 except: pass
 
-            for hwnd in windows:
-                try:
-                    win32gui.ShowWindow(hwnd, win32con.SW_MINIMIZE)
-                    win32gui.EnableWindow(hwnd, False)
-                    win32gui.ShowWindow(hwnd, win32con.SW_HIDE)
-                except: pass
+        suspended = []
+        for pid, windows in targets.items():
+            if windows:
+                self.blocked_windows[pid] = windows
+                for hwnd in windows:
+                    try:
+                        win32gui.ShowWindow(hwnd, win32con.SW_MINIMIZE)
+                        win32gui.EnableWindow(hwnd, False)
+                        win32gui.ShowWindow(hwnd, win32con.SW_HIDE)
+                    except: pass
 
-        if pid not in self.suspended_pids:
             try:
                 p = psutil.Process(pid)
                 p.suspend()
                 self.suspended_pids.add(pid)
-            except: pass
+                suspended.append(pid)
+            except:
+                # Заморозить не удалось (AccessDenied, повышенные права) -
+                # окна не оставляем скрытыми: блокировка не состоялась
+                self._restore_windows(pid)
+        return suspended
 
+    def unblock_processes(self, pids) -> list:
+        """
+        Разблокировка набора процессов. Окна берутся из сохраненных при
+        блокировке - перебор окон не нужен.
+
+        Returns:
+            список PID, которые были заблокированы и разблокированы этим вызовом.
+        """
+        released = []
+        for pid in pids:
+            if pid in self.suspended_pids or pid in self.blocked_windows:
+                self.unblock_process_window(pid)
+                released.append(pid)
+        return released
     def unblock_process_window(self, pid: int):
         """Разблокировка: Разморозить -> Показать окна."""
         if pid in self.suspended_pids:
@@ -103,8 +174,15 @@ class SystemController:
                 p = psutil.Process(pid)
                 p.resume()
                 self.suspended_pids.remove(pid)
-            except: self.suspended_pids.discard(pid)
+            except psutil.NoSuchProcess: self.suspended_pids.discard(pid)
+            except:
+                # PID остается замороженным - EnforcementReconciler повторит.
+                # Окна не показываем, пока процесс не разморожен.
+                return
+        self._restore_windows(pid)
 
+    def _restore_windows(self, pid: int):
+        """Показывает и включает окна, скрытые при блокировке PID."""
         if pid in self.blocked_windows:
             windows = self.blocked_windows[pid]
             for hwnd in windows:
@@ -0,0 +1,94 @@
+import cv2
+
+from ..config import TRACK_REDETECT_EVERY, TRACK_MIN_CONFIDENCE
+
+
+class FaceTracker:
+    """
+    Сопровождение авторизованного лица между кадрами.
+
+    После успешного опознания запоминается шаблон лица (серый фрагмент
+    уменьшенного кадра). На следующих кадрах лицо ищется корреляцией шаблона
+    (cv2.matchTemplate) в окрестности прошлой рамки - это на порядки дешевле,
+    чем HOG + face_encodings.
+
+    Полная детекция и опознание снова выполняются:
+    - каждые redetect_every кадров;
+    - если корреляция упала ниже min_confidence (человек ушел/сменился).
+
+    Шаблон не обновляется между детекциями, чтобы рамка не "уплыла"
+    на фон или на другого человека.
+    """
+
+    # Насколько расширять область поиска вокруг прошлой рамки (доля размера лица)
+    SEARCH_MARGIN = 0.5
+    # Лица меньше этого размера (px) не сопровождаем - корреляция ненадежна
+    MIN_FACE_SIZE = 12
+
+    def __init__(self, redetect_every=TRACK_REDETECT_EVERY, min_confidence=TRACK_MIN_CONFIDENCE):
+        self.redetect_every = redetect_every
+        self.min_confidence = min_confidence
+        self.reset()
+
+    def reset(self):
+        """Сброс сопровождения (новая сессия, потеря лица, сброс Liveness)."""
+        self.template = None
+        self.box = None         # (top, right, bottom, left) в координатах уменьшенного кадра
+        self.match = None       # FaceMatch, полученный при последней детекции
+        self.frames_since_detect = 0
+        self.confidence = 0.0
+
+    @property
+    def active(self):
+        return self.template is not None
+
+    def start(self, rgb_small, face_loc, match):
+        """Начинает сопровождение лица, опознанного полной детекцией."""
+        top, right, bottom, left = face_loc
+        if min(bottom - top, right - left) < self.MIN_FACE_SIZE:
+            self.reset()
+            return
+
+        gray = cv2.cvtColor(rgb_small, cv2.COLOR_RGB2GRAY)
+        self.template = gray[top:bottom, left:right].copy()
+        self.box = face_loc
+        self.match = match
+        self.frames_since_detect = 0
+        self.confidence = 1.0
+
+    def update(self, rgb_small):
+        """
+        Ищет лицо на новом кадре.
+
+        Returns:
+            bool: True - лицо найдено на прежнем месте, детекцию можно пропустить.
+                  False - нужна полная детекция и опознание.
+        """
+        if not self.active or self.frames_since_detect >= self.redetect_every:
+            return False
+
+        gray = cv2.cvtColor(rgb_small, cv2.COLOR_RGB2GRAY)
+        h, w = gray.shape
+        top, right, bottom, left = self.box
+        th, tw = self.template.shape
+        mh, mw = int(th * self.SEARCH_MARGIN), int(tw * self.SEARCH_MARGIN)
+
+        y1, y2 = max(0, top - mh), min(h, bottom + mh)
+        x1, x2 = max(0, left - mw), min(w, right + mw)
+        window = gray[y1:y2, x1:x2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            self.reset()
+            return False
+
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, max_val, _, (dx, dy) = cv2.minMaxLoc(scores)
+        self.confidence = max_val
+
+        if max_val < self.min_confidence:
+            self.reset()
+            return False
+
+        new_top, new_left = y1 + dy, x1 + dx
+        self.box = (new_top, new_left + tw, new_top + th, new_left)
+        self.frames_since_detect += 1
+        return True
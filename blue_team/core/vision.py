@@ -1,12 +1,62 @@
 import face_recognition
 import cv2
 import numpy as np
-import pickle
+import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, BrokenExecutor
 from pathlib import Path
 
 # Импортируем конфиги
-from ..config import CAMERA_INDEX, FACE_TOLERANCE, FRAME_SCALING
+from ..config import (
+    FACE_TOLERANCE, FRAME_SCALING, TRACKING_ENABLED, FRAME_WAIT_TIMEOUT, LIVENESS_WORKERS,
+    LIVENESS_MODE, SCENE_GATE_ENABLED, QUALITY_GATE_ENABLED, QUALITY_MAX_SKIPS,
+    QUALITY_GRACE_PERIOD, CAMERA_STANDBY_FPS
+)
+from .capture import FrameGrabber
+from .detection import create_detector, to_full_frame, get_predetector
+from .gallery import FaceGallery
+from .gates import SceneChangeGate, FrameQualityGate
+from .liveness import LivenessAnalyzer, SequentialLivenessTest
+from .metrics import METRICS
+from .tracking import FaceTracker
+
+def _detect_and_encode(rgb_small):
+    """
+    Детекция и кодирование лиц одного кадра.
+    Функция верхнего уровня: выполняется в процессах пула VisionSystem.
+    Длительности этапов (детекция, кодирование) возвращаются вместе
+    с результатом - реестр метрик процесса пула сервису не виден.
+
+    Здесь всегда полный HOG без каскадного пред-детектора: каскад
+    пропускает повернутых/профильных чужих, а проверка живости должна
+    увидеть каждое лицо в кадре.
+    """
+    t0 = time.perf_counter()
+    locs = face_recognition.face_locations(rgb_small)
+    t1 = time.perf_counter()
+    if not locs:
+        return locs, [], (t1 - t0, 0.0)
+    encs = face_recognition.face_encodings(rgb_small, locs)
+    return locs, encs, (t1 - t0, time.perf_counter() - t1)
+
+
+def _warm_up_models():
+    """
+    Холостой прогон детекции и кодирования (модели dlib).
+    Кодирование запускается на заданной рамке: на пустом кадре лиц нет,
+    и без рамки модели кодирования не были бы задействованы.
+    Функция верхнего уровня: выполняется и в процессах пула.
+    """
+    t0 = time.perf_counter()
+    # Размер уменьшенного кадра камеры 640x480
+    h, w = int(480 * FRAME_SCALING), int(640 * FRAME_SCALING)
+    rgb = np.zeros((h, w, 3), dtype=np.uint8)
+    face_recognition.face_locations(rgb)
+    face_recognition.face_encodings(rgb, [(h // 4, 3 * w // 4, 3 * h // 4, w // 4)])
+    return time.perf_counter() - t0
+
 
 class VisionSystem:
     """
@@ -21,226 +71,549 @@ class VisionSystem:
     Не требует скачивания файлов. Работает автономно.
     """
 
-    def __init__(self, db_manager):
+    def __init__(self, db_manager, source=None, primary=None):
         self.db = db_manager
-        self.known_users = [] 
-        self.update_cache()
-        self.cap = None
+        # primary - VisionSystem основной камеры (CameraGroup): с ней
+        # разделяются галерея и пулы проверки живости
+        self.primary = primary
+        self.gallery = FaceGallery()
+        self.revision = 0       # Ревизия БД (change_log), на которой построена галерея
+        self.last_match = None  # FaceMatch последнего опознанного сотрудника
+        # Последний отказ check_liveness_and_auth - чужой или фейк в кадре
+        # (а не отсутствие лиц/непригодные кадры)
+        self.last_veto = False
+        # Роли, допущенные к активным приложениям/файлам (None - все роли)
+        self.allowed_roles = None
+        self.tracker = FaceTracker()
+        # Детектор для check_authorization (весь кадр или адаптивная ROI)
+        self.detector = create_detector()
+        # Фильтр неизменной сцены перед распознаванием
+        self.scene_gate = SceneChangeGate()
+        # Отсев темных, пересвеченных и смазанных кадров до детекции
+        self.quality_gate = FrameQualityGate()
+        self._bad_since = 0.0  # Начало серии непригодных кадров (0 - серии нет)
+        # Счетчики check_authorization (сколько распознаваний удалось пропустить)
+        self.stats = {
+            'auth_checks': 0,       # Всего вызовов с кадром
+            'scene_skips': 0,       # Сцена не изменилась - результат переиспользован
+            'tracker_skips': 0,     # Лицо сопровождено трекером
+            'recognitions': 0,      # Полная детекция + кодирование
+            'quality_skips': 0,     # Кадр отброшен фильтром качества
+            'no_face': 0,           # Детекция на пригодном кадре не нашла лиц
+        }
+        if primary is None:
+            self.update_cache()
+        else:
+            self.share_cache(primary)
+        # Источник кадров (по умолчанию config.FRAME_SOURCE) читается фоновым потоком;
+        # поток запускается при первом запросе кадра
+        self.grabber = FrameGrabber(source)
+        # Пулы конвейера проверки живости (см. _get_pools)
+        self._detect_pool = None
+        self._score_pool = None
+        self._pipeline_depth = 2
+        self._pool_workers = 0
+        # Пулы создаются и закрываются из цикла защиты и из фонового прогрева
+        self._pools_lock = threading.Lock()
+        # Свой LivenessAnalyzer (с буферами) у каждого потока анализа
+        self._thread_local = threading.local()
 
     def update_cache(self):
         try:
-            raw_data = self.db.get_all_encodings()
-            new_cache = []
-            for row in raw_data:
-                if row[3]:
-                    try:
-                        dec = self.db.crypto.decrypt_bytes(row[3])
-                        new_cache.append(pickle.loads(dec))
-                    except: continue
-            self.known_users = new_cache
-            print(f"[VISION] Загружено эталонов лиц: {len(self.known_users)}")
+            # Есть база для дельты - применяем только изменения из журнала
+            if self.revision and self._apply_gallery_changes():
+                return
+            # Ревизию берем ДО чтения: изменения, попавшие между ними,
+            # применятся повторно при следующей перезагрузке (это безопасно)
+            revision = self.db.get_revision()
+            # Вся галерея - одна расшифровка снимка и view через np.frombuffer
+            user_ids, names, roles, matrix = self.db.load_gallery()
+            # Подмена ссылки целиком: цикл защиты видит либо старую, либо новую галерею
+            self.gallery = FaceGallery(user_ids, names, roles, matrix).build_index(previous=self.gallery)
+            self.revision = revision
+            print(f"[VISION] Загружено эталонов лиц: {len(self.gallery)}")
         except: pass
 
+    def set_allowed_roles(self, roles):
+        """
+        Ограничивает опознание сотрудниками указанных ролей (None - без ограничений).
+        При смене набора ролей сопровождение сбрасывается: прошлое опознание
+        могло относиться к сотруднику, который теперь не допущен.
+        """
+        roles = None if roles is None else frozenset(roles)
+        if roles == self.allowed_roles: return
+        self.allowed_roles = roles
+        self.reset_tracking()
+
+    def _active_gallery(self):
+        """Галерея для сравнения: раздел допущенных ролей или вся галерея."""
+        gallery = self.gallery
+        if self.allowed_roles is None:
+            return gallery
+        return gallery.for_roles(self.allowed_roles)
+
+    def share_cache(self, other):
+        """Берет готовую галерею другой VisionSystem (без чтения БД)."""
+        self.gallery = other.gallery
+        self.revision = other.revision
+
+    def _apply_gallery_changes(self):
+        """
+        Инкрементальное обновление галереи по журналу изменений users.
+        Расшифровываются только добавленные/измененные строки.
+
+        Returns:
+            bool: False - журнал обрезан, нужна полная перезагрузка.
+        """
+        delta = self.db.get_changes('users', self.revision)
+        if delta is None:
+            return False
+        revision, changes = delta
+        if changes:
+            changed = [uid for uid, op in changes.items() if op != 'D']
+            upserts = [
+                (uid, name, role, self.db.decode_encoding(blob))
+                for uid, name, role, blob in self.db.get_encodings_by_ids(changed)
+            ]
+            # Строка могла быть удалена уже после чтения журнала
+            found = {row[0] for row in upserts}
+            deleted = [uid for uid, op in changes.items() if op == 'D' or uid not in found]
+            self.gallery = self.gallery.with_changes(upserts, deleted).build_index(previous=self.gallery)
+            print(f"[VISION] Галерея обновлена: +{len(upserts)} / -{len(deleted)} (всего {len(self.gallery)})")
+        self.revision = revision
+        return True
+
+    def _next_frame(self, after_seq=0):
+        """Свежий кадр (Frame) из фонового захвата. Ждет только при холодном старте камеры."""
+        # Камера выключена или в резерве - полная частота
+        # (дочитанный до конца файл не перезапускается)
+        if (not self.grabber.running or self.grabber.idle) and not self.grabber.ended:
+            self.grabber.start()
+        return self.grabber.latest(timeout=FRAME_WAIT_TIMEOUT, after_seq=after_seq)
+
     def _get_frame(self, high_res=False):
-        if self.cap is None or not self.cap.isOpened():
-            self.cap = cv2.VideoCapture(CAMERA_INDEX, cv2.CAP_DSHOW)
-            if not self.cap.isOpened(): return None
-        ret, frame = self.cap.read()
-        if not ret: return None
-        if high_res: return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        try:
-            small = cv2.resize(frame, (0, 0), fx=FRAME_SCALING, fy=FRAME_SCALING)
-            return cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-        except: return None
+        frame = self._next_frame()
+        if frame is None: return None
+        if high_res: return cv2.cvtColor(frame.bgr, cv2.COLOR_BGR2RGB)
+        # Уменьшенная RGB-копия уже подготовлена потоком захвата
+        return frame.rgb_small
+
+    def _skip_bad_frames(self, frame):
+        """
+        Пропускает непригодные кадры (темнота, пересвет, смаз), ожидая
+        следующие. Возвращает первый пригодный кадр или None, если
+        QUALITY_MAX_SKIPS кадров подряд оказались непригодны.
+        """
+        for _ in range(QUALITY_MAX_SKIPS):
+            if self.quality_gate.check(frame.rgb_small) is None:
+                self._bad_since = 0.0
+                return frame
+            self.stats['quality_skips'] += 1
+            if not self._bad_since:
+                self._bad_since = time.monotonic()
+            frame = self._next_frame(after_seq=frame.seq)
+            if frame is None:
+                return None
+        return None
 
     def check_authorization(self):
-        if not self.known_users: return False
-        rgb = self._get_frame(high_res=False)
-        if rgb is None: return False
-        locs = face_recognition.face_locations(rgb)
-        if not locs: return False
-        encs = face_recognition.face_encodings(rgb, locs)
-        for enc in encs:
-            matches = face_recognition.compare_faces(self.known_users, enc, tolerance=FACE_TOLERANCE)
-            if True in matches: return True
+        """
+        True - сотрудник опознан, False - нет.
+        None - кадры непригодны (темнота, пересвет, смаз): решение откладывается,
+        но не дольше QUALITY_GRACE_PERIOD секунд подряд, затем - False.
+        """
+        with METRICS.span('auth.total'):
+            return self._check_authorization()
+
+    def _check_authorization(self):
+        gallery = self._active_gallery()
+        if not len(gallery): return False
+        with METRICS.span('auth.frame'):
+            frame = self._next_frame()
+        if frame is None: return False
+        self.stats['auth_checks'] += 1
+
+        # Непригодный кадр не тратит детекцию и не считается промахом
+        if QUALITY_GATE_ENABLED:
+            with METRICS.span('auth.quality'):
+                frame = self._skip_bad_frames(frame)
+            if frame is None:
+                if self._bad_since and time.monotonic() - self._bad_since < QUALITY_GRACE_PERIOD:
+                    return None
+                return False
+
+        # Сцена не изменилась с последнего опознания - результат тот же
+        if SCENE_GATE_ENABLED:
+            with METRICS.span('auth.scene_gate'):
+                unchanged = self.scene_gate.unchanged(frame.rgb_small)
+            if unchanged:
+                self.stats['scene_skips'] += 1
+                return True
+
+        # Лицо на прежнем месте - пропускаем детекцию и опознание
+        if TRACKING_ENABLED:
+            with METRICS.span('auth.tracker'):
+                tracked = self.tracker.update(frame.rgb_small)
+            if tracked:
+                self.stats['tracker_skips'] += 1
+                return True
+
+        self.stats['recognitions'] += 1
+        with METRICS.span('auth.detect'):
+            det = self.detector.detect(frame)
+        if not det.locations:
+            self.stats['no_face'] += 1
+            self.tracker.reset()
+            return False
+        with METRICS.span('auth.encode'):
+            encs = face_recognition.face_encodings(det.image, det.locations)
+        with METRICS.span('auth.match'):
+            matches = gallery.match(encs, FACE_TOLERANCE)
+        for loc, match in zip(det.locations, matches):
+            if match:
+                self.last_match = match
+                full_box = to_full_frame(det, loc)
+                self.detector.observe(full_box)
+                if TRACKING_ENABLED:
+                    small_box = tuple(int(v * FRAME_SCALING) for v in full_box)
+                    self.tracker.start(frame.rgb_small, small_box, match)
+                if SCENE_GATE_ENABLED:
+                    self.scene_gate.remember(frame.rgb_small)
+                return True
+        self.tracker.reset()
         return False
 
-    def _check_glare_hsv(self, img_bgr):
+    def reset_tracking(self):
+        """Сбрасывает сопровождение лица (вызывается при сбросе Liveness)."""
+        self.tracker.reset()
+        self.detector.reset()
+        self.scene_gate.reset()
+
+    def get_stats(self):
+        """Счетчики check_authorization и доля пропущенных распознаваний."""
+        stats = dict(self.stats)
+        checks = stats['auth_checks']
+        skipped = stats['scene_skips'] + stats['tracker_skips']
+        stats['skip_rate'] = round(skipped / checks, 3) if checks else 0.0
+        stats['allowed_roles'] = sorted(self.allowed_roles) if self.allowed_roles is not None else None
+        stats['search_size'] = len(self._active_gallery())
+        stats['quality_reasons'] = dict(self.quality_gate.counts)
+        return stats
+
+    def _get_pools(self):
         """
-        1. АНАЛИЗ БЛИКОВ (HSV).
-        Экраны отражают свет ламп. Кожа рассеивает.
+        Пулы конвейера проверки живости (создаются один раз на весь сервис).
+        - detect_pool: процессы для HOG-детекции и face_encodings
+          (dlib держит GIL, поэтому параллелизм дают только процессы);
+        - score_pool: потоки для анализа живости (OpenCV отпускает GIL).
+        Вторичные камеры используют пулы основной.
         """
-        hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
-        h, s, v = cv2.split(hsv)
+        if self.primary is not None:
+            pools = self.primary._get_pools()
+            self._pipeline_depth = self.primary._pipeline_depth
+            return pools
+        with self._pools_lock:
+            if self._detect_pool is None:
+                workers = LIVENESS_WORKERS or max(1, min(4, (os.cpu_count() or 2) - 1))
+                if workers > 1:
+                    self._detect_pool = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    self._detect_pool = ThreadPoolExecutor(max_workers=1)
+                self._score_pool = ThreadPoolExecutor(max_workers=max(2, workers))
+                self._pipeline_depth = max(2, workers)
+                self._pool_workers = workers
+            return self._detect_pool, self._score_pool
 
-        # Пиксели ярче 250 считаем жестким бликом
-        glare_pixels = np.count_nonzero(v > 250)
-        total_pixels = v.size
-        glare_ratio = glare_pixels / total_pixels
+    def _shutdown_pools(self):
+        if self.primary is not None:
+            # Пулы принадлежат основной камере - закрывает их только она
+            return
+        with self._pools_lock:
+            for pool in (self._detect_pool, self._score_pool):
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+            self._detect_pool = None
+            self._score_pool = None
 
-        # Если > 1% лица в жестком блике — это стекло/экран
-        if glare_ratio > 0.01:
-            return False, f"Блик стекла ({glare_ratio:.3f})"
-        
-        return True, "OK"
+    def _get_analyzer(self):
+        analyzer = getattr(self._thread_local, 'analyzer', None)
+        if analyzer is None:
+            analyzer = LivenessAnalyzer()
+            self._thread_local.analyzer = analyzer
+        return analyzer
 
-    def _check_skin_ycrcb(self, img_bgr):
+    def _score_face(self, frame_bgr, face_loc):
         """
-        2. СПЕКТРАЛЬНЫЙ АНАЛИЗ (YCrCb).
-        Человеческая кожа имеет очень специфический диапазон в каналах Cr и Cb.
-        Экраны планшетов (RGB) часто выходят за эти рамки.
+        Анализ "живости" одного лица за один проход (LivenessAnalyzer).
+
+        Returns:
+            LivenessScore или None, если рамка вышла за кадр.
         """
-        img_ycrcb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2YCrCb)
+        top, right, bottom, left = face_loc
+        factor = 1.0 / FRAME_SCALING
         
-        # Диапазоны "здоровой кожи" в YCrCb (научные данные)
-        # Y (Яркость) - игнорируем (любое освещение)
-        # Cr (Красный компонент): 133-173
-        # Cb (Синий компонент): 77-127
-        min_skin = np.array([0, 133, 77], dtype=np.uint8)
-        max_skin = np.array([255, 173, 127], dtype=np.uint8)
-
-        # Создаем маску: какие пиксели похожи на кожу?
-        mask = cv2.inRange(img_ycrcb, min_skin, max_skin)
+        # Вырезаем лицо в полном разрешении для анализа текстуры
+        # Чуть расширяем рамку, чтобы захватить контуры
+        h, w, _ = frame_bgr.shape
+        pad = 20
+        y1 = max(0, int(top*factor) - pad)
+        y2 = min(h, int(bottom*factor) + pad)
+        x1 = max(0, int(left*factor) - pad)
+        x2 = min(w, int(right*factor) + pad)
         
-        skin_pixels = cv2.countNonZero(mask)
-        total_pixels = img_bgr.shape[0] * img_bgr.shape[1]
-        skin_ratio = skin_pixels / total_pixels
-
-        # Если меньше 50% лица похоже на человеческую кожу -> это подделка
-        # (Например, синеватый экран или ч/б принтер)
-        if skin_ratio < 0.50:
-            return False, f"Неестественный спектр кожи ({skin_ratio:.2f})"
-            
-        return True, "OK"
+        face_crop = frame_bgr[y1:y2, x1:x2]
+        
+        if face_crop.size == 0: return None
+
+        # Блики (HSV), спектр кожи (YCrCb) и текстура (Laplacian) - одним проходом
+        with METRICS.span('liveness.analyze'):
+            return self._get_analyzer().analyze(face_crop)
 
-    def _check_texture_laplacian(self, img_bgr):
+    def _judge_frame(self, matches, liveness):
         """
-        3. АНАЛИЗ ТЕКСТУРЫ (Laplacian).
-        Проверяет "зернистость" изображения.
-        
-        - Экран: Видна пиксельная решетка -> Высокая "резкость" шума.
-        - Бумага: Размытие при печати -> Очень низкая резкость.
-        - Живое лицо: Средняя естественная резкость.
+        Решение по одному кадру.
+
+        Returns:
+            tuple: (bool, msg) - окончательное решение, либо None - кадр
+                   ничего не решает (лиц нет), нужно смотреть следующий.
         """
-        gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-        
-        # Вычисляем дисперсию Лапласиана (меру четкости граней)
-        focus_measure = cv2.Laplacian(gray, cv2.CV_64F).var()
-        
-        # Пороги (нужно калибровать под камеру, но это средние значения)
-        # < 100: Слишком мыльно (размытое фото/бумага)
-        # > 900: Слишком резко (пиксельный шум экрана/зерно)
-        
-        if focus_measure < 80:
-            return False, f"Размытая текстура (Бумага/Фото) Val:{focus_measure:.0f}"
-        
-        # Если камера HD, экраны могут давать шум > 1000
-        # Живое лицо обычно в диапазоне 100 - 600
-        if focus_measure > 1200:
-            return False, f"Пиксельная сетка (Экран) Val:{focus_measure:.0f}"
+        frame_is_clean = True
+        valid_users_found = 0
+
+        for i, (match, score) in enumerate(zip(matches, liveness)):
+            if score is None: continue
+
+            # --- АНАЛИЗ ЛИЧНОСТИ ---
+            is_known = match is not None
+            
+            # ЛОГИРОВАНИЕ
+            status = ""
+            if not is_known:
+                status = "ЧУЖОЙ"
+                frame_is_clean = False
+            elif not score.is_live:
+                status = f"ФЕЙК [{score.reason}]"
+                frame_is_clean = False
+            else:
+                status = f"СОТРУДНИК ({match.name})"
+                valid_users_found += 1
+                self.last_match = match
             
-        return True, f"OK ({focus_measure:.0f})"
+            print(f"[DEBUG] Лицо #{i+1}: {status}")
+
+            if not frame_is_clean:
+                print(f">>> БЛОКИРОВКА: {status} <<<")
+                return False, f"Доступ запрещен: {status}"
+
+        # Если все чисто и есть сотрудник
+        if frame_is_clean and valid_users_found > 0:
+            print(f">>> УСПЕХ: Доступ разрешен <<<")
+            return True, "Доступ разрешен."
+        return None
+
+    def _judge_frame_sequential(self, test, matches, liveness):
+        """
+        Решение по кадру в режиме накопления (LIVENESS_MODE = "sequential").
+        Чужой по-прежнему блокирует сразу; оценки живости сотрудников
+        накапливаются в SequentialLivenessTest (берется самое слабое лицо кадра).
+        """
+        weakest = None
+        for i, (match, score) in enumerate(zip(matches, liveness)):
+            if score is None: continue
+            if match is None:
+                print(f"[DEBUG] Лицо #{i+1}: ЧУЖОЙ")
+                print(">>> БЛОКИРОВКА: ЧУЖОЙ <<<")
+                return False, "Доступ запрещен: ЧУЖОЙ"
+            llr = test.frame_llr(score)
+            if weakest is None or llr < weakest[2]:
+                weakest = (match, score, llr)
+
+        if weakest is None: return None
+        match, score, _ = weakest
+        decision = test.add(score)
+        print(f"[DEBUG] Кадр {test.frames}: {match.name}, LLR={test.llr:+.2f} [{score.reason}]")
+
+        if decision is True:
+            self.last_match = match
+            print(f">>> УСПЕХ: Доступ разрешен <<<")
+            return True, "Доступ разрешен."
+        if decision is False:
+            status = f"ФЕЙК [{score.reason}]"
+            print(f">>> БЛОКИРОВКА: {status} <<<")
+            return False, f"Доступ запрещен: {status}"
+        return None
 
     def check_liveness_and_auth(self):
         """
         Комбинированная физическая проверка.
+
+        Конвейер: пока кадр N проходит анализ живости (потоки), кадр N+1
+        уже детектируется (процессы), а поток захвата готовит следующий.
+        Кадры оцениваются строго по порядку, поэтому решение то же, что
+        и при последовательной обработке: любой чужой/фейк блокирует,
+        один чистый кадр с сотрудником дает доступ.
+
+        В режиме LIVENESS_MODE = "sequential" оценки кадров накапливаются,
+        и решение принимается, как только набрана уверенность
+        (не больше LIVENESS_MAX_FRAMES кадров с лицом; кадров без лиц
+        подряд - не больше 5, как и в обычном режиме).
         """
+        with METRICS.span('liveness.total'):
+            return self._check_liveness_and_auth()
+
+    def _check_liveness_and_auth(self):
+        self.last_veto = False
+        sequential = LIVENESS_MODE == "sequential"
+        test = SequentialLivenessTest() if sequential else None
         FRAMES_TO_CHECK = 5
         
         print("[VISION] Сканирование (Physics Mode)...")
 
-        for _ in range(FRAMES_TO_CHECK):
-            if self.cap is None or not self.cap.isOpened():
-                self.cap = cv2.VideoCapture(CAMERA_INDEX, cv2.CAP_DSHOW)
-            
-            ret, frame_bgr = self.cap.read()
-            if not ret: break
-            
-            small_bgr = cv2.resize(frame_bgr, (0, 0), fx=FRAME_SCALING, fy=FRAME_SCALING)
-            rgb_small = cv2.cvtColor(small_bgr, cv2.COLOR_BGR2RGB)
-            
-            # 1. Поиск лиц
-            locs = face_recognition.face_locations(rgb_small)
-            if not locs:
-                time.sleep(0.05)
-                continue
-            
-            encs = face_recognition.face_encodings(rgb_small, locs)
-            
-            frame_is_clean = True
-            valid_users_found = 0
-            
-            for i, face_loc in enumerate(locs):
-                # --- АНАЛИЗ "ЖИВОСТИ" ---
-                top, right, bottom, left = face_loc
-                factor = 1.0 / FRAME_SCALING
-                
-                # Вырезаем лицо в полном разрешении для анализа текстуры
-                # Чуть расширяем рамку, чтобы захватить контуры
-                h, w, _ = frame_bgr.shape
-                pad = 20
-                y1 = max(0, int(top*factor) - pad)
-                y2 = min(h, int(bottom*factor) + pad)
-                x1 = max(0, int(left*factor) - pad)
-                x2 = min(w, int(right*factor) + pad)
-                
-                face_crop = frame_bgr[y1:y2, x1:x2]
-                
-                if face_crop.size == 0: continue
-
-                # ПРОВЕРКА 1: Блики
-                is_live_glare, msg_glare = self._check_glare_hsv(face_crop)
-                
-                # ПРОВЕРКА 2: Спектр кожи (YCrCb)
-                is_live_skin, msg_skin = self._check_skin_ycrcb(face_crop)
-                
-                # ПРОВЕРКА 3: Текстура (Laplacian)
-                is_live_tex, msg_tex = self._check_texture_laplacian(face_crop)
-                
-                # Итоговый статус живости
-                is_live = is_live_glare and is_live_skin and is_live_tex
-                
-                reason = "OK"
-                if not is_live_glare: reason = msg_glare
-                elif not is_live_skin: reason = msg_skin
-                elif not is_live_tex: reason = msg_tex
-                
-                # --- АНАЛИЗ ЛИЧНОСТИ ---
-                current_encoding = encs[i]
-                is_known = False
-                if self.known_users:
-                    matches = face_recognition.compare_faces(self.known_users, current_encoding, tolerance=FACE_TOLERANCE)
-                    if True in matches:
-                        is_known = True
-                
-                # ЛОГИРОВАНИЕ
-                status = ""
-                if not is_known:
-                    status = "ЧУЖОЙ"
-                    frame_is_clean = False
-                elif not is_live:
-                    status = f"ФЕЙК [{reason}]"
-                    frame_is_clean = False
-                else:
-                    status = "СОТРУДНИК"
-                    valid_users_found += 1
-                
-                print(f"[DEBUG] Лицо #{i+1}: {status}")
+        gallery = self._active_gallery()
+        detect_pool, score_pool = self._get_pools()
+        in_flight = deque()  # (frame, future детекции) в порядке захвата
+        state = {'last_seq': 0, 'captured': 0, 'skipped': 0, 'empty': 0, 'judging': 0, 'camera_ok': True}
+
+        def budget_left():
+            if not sequential:
+                return state['captured'] < FRAMES_TO_CHECK
+            # В тест идут только кадры с лицом (включая те, что еще в конвейере);
+            # кадров без лиц подряд - не больше FRAMES_TO_CHECK
+            pending = test.frames + len(in_flight) + state['judging']
+            return pending < test.max_frames and state['empty'] < FRAMES_TO_CHECK
 
-                if not frame_is_clean:
-                    print(f">>> БЛОКИРОВКА: {status} <<<")
-                    return False, f"Доступ запрещен: {status}"
+        def fill_pipeline():
+            while (state['camera_ok'] and budget_left()
+                   and len(in_flight) < self._pipeline_depth):
+                # Каждый раз берем новый кадр (не анализируем один кадр дважды)
+                with METRICS.span('liveness.frame'):
+                    frame = self._next_frame(after_seq=state['last_seq'])
+                if frame is None:
+                    state['camera_ok'] = False
+                    return
+                state['last_seq'] = frame.seq
+                # Непригодный кадр не занимает место в серии (но не больше QUALITY_MAX_SKIPS)
+                if (QUALITY_GATE_ENABLED and state['skipped'] < QUALITY_MAX_SKIPS
+                        and self.quality_gate.check(frame.rgb_small) is not None):
+                    state['skipped'] += 1
+                    self.stats['quality_skips'] += 1
+                    continue
+                state['captured'] += 1
+                in_flight.append((frame, detect_pool.submit(_detect_and_encode, frame.rgb_small)))
 
-            # Если все чисто и есть сотрудник
-            if frame_is_clean and valid_users_found > 0:
-                print(f">>> УСПЕХ: Доступ разрешен <<<")
-                return True, "Доступ разрешен."
+        try:
+            fill_pipeline()
+            while in_flight:
+                frame, detect_future = in_flight.popleft()
+                state['judging'] = 1
+
+                # 1. Поиск лиц
+                with METRICS.span('liveness.detect_wait'):
+                    locs, encs, (t_detect, t_encode) = detect_future.result()
+                METRICS.record('liveness.detect', t_detect)
+                if locs:
+                    METRICS.record('liveness.encode', t_encode)
+                # Следующие кадры детектируются, пока этот анализируется
+                fill_pipeline()
+                state['judging'] = 0
+                if not locs:
+                    state['empty'] += 1
+                    fill_pipeline()
+                    continue
 
-            time.sleep(0.05)
+                # 2. Живость всех лиц кадра - параллельно
+                score_futures = [score_pool.submit(self._score_face, frame.bgr, loc) for loc in locs]
+                # Одно пакетное сравнение всех лиц кадра с галереей
+                with METRICS.span('liveness.match'):
+                    matches = gallery.match(encs, FACE_TOLERANCE)
+                with METRICS.span('liveness.analyze_wait'):
+                    liveness = [f.result() for f in score_futures]
 
+                if sequential:
+                    observed = test.frames
+                    verdict = self._judge_frame_sequential(test, matches, liveness)
+                    if test.frames == observed:
+                        # Кадр без оценки живости не тратит бюджет теста
+                        state['empty'] += 1
+                        fill_pipeline()
+                    else:
+                        state['empty'] = 0
+                else:
+                    verdict = self._judge_frame(matches, liveness)
+                if verdict is not None:
+                    # Отказ судьи кадра - всегда чужой или фейк
+                    self.last_veto = not verdict[0]
+                    return verdict
+        except BrokenExecutor:
+            # Процесс пула аварийно завершился - пулы пересоздадутся при следующей проверке
+            self._shutdown_pools()
+            raise
+        finally:
+            # Решение принято - недоделанные кадры не нужны
+            for _, future in in_flight:
+                future.cancel()
+
+        if sequential and test.frames:
+            return False, "Доступ запрещен (Недостаточно уверенности)"
+        if state['skipped']:
+            return False, f"Доступ запрещен (Нет лиц, непригодных кадров: {state['skipped']})"
         return False, "Доступ запрещен (Нет лиц)"
 
+    def warm_up(self):
+        """
+        Прогрев перед первой проверкой (WARMUP_ENABLED), можно в фоновом потоке:
+        - холостая детекция и кодирование (модели dlib общие для процесса);
+        - запуск процессов пула детекции с тем же прогоном в каждом
+          (процесс при старте заново загружает модели dlib);
+        - анализаторы живости в потоках пула анализа.
+        Вторичные камеры прогревают только модели - пулы общие.
+        Каскад пред-детектора у каждого потока свой - его загружает
+        prepare_thread() в потоке проверок.
+
+        Returns:
+            длительность прогрева (сек).
+        """
+        t0 = time.perf_counter()
+        with METRICS.span('warmup.models'):
+            _warm_up_models()
+        if self.primary is None:
+            with METRICS.span('warmup.pools'):
+                detect_pool, score_pool = self._get_pools()
+                workers = max(1, self._pool_workers)
+                # Задачи отправляются разом, чтобы пул запустил все процессы
+                futures = [detect_pool.submit(_warm_up_models) for _ in range(workers)]
+                futures += [score_pool.submit(self._get_analyzer) for _ in range(max(2, workers))]
+                for f in futures:
+                    f.result()
+        elapsed = time.perf_counter() - t0
+        print(f"[VISION] Прогрев завершен за {elapsed * 1000:.0f} мс")
+        return elapsed
+
+    def prepare_thread(self):
+        """
+        Загружает пред-детектор потока (config.PREDETECT_ENABLED).
+        Вызывается в потоке, который выполняет check_authorization:
+        каскад у каждого потока свой (см. get_predetector).
+        """
+        get_predetector()
+
+    def standby(self):
+        """Покой без закрытия камеры: источник читается с частотой CAMERA_STANDBY_FPS."""
+        self.tracker.reset()
+        self.scene_gate.reset()
+        self.grabber.standby(CAMERA_STANDBY_FPS)
+
+    def has_signal(self):
+        """Есть ли свежий кадр от камеры (без ожидания)."""
+        return self.grabber.peek() is not None
+
     def release(self):
-        if self.cap:
-            self.cap.release()
-            self.cap = None
\ No newline at end of file
+        """Выключает камеру. Пулы конвейера остаются прогретыми до close()."""
+        self.tracker.reset()
+        self.scene_gate.reset()
+        self.grabber.stop()
+
+    def close(self):
+        """Остановка сервиса: камера и пулы конвейера."""
+        self.release()
+        self._shutdown_pools()
\ No newline at end of file
@@ -8,10 +8,15 @@ import win32crypt # pywin32 для защиты токена (DPAPI)
 
 # Импорты ядра
 from ..core.database import DatabaseManager
-from ..core.vision import VisionSystem
+from ..core.multicam import create_vision
 from ..core.system import SystemController
+from ..core.metrics import METRICS
+from ..core.enforcement import EnforcementReconciler
 # Конфигурация
-from ..config import FACE_CHECK_INTERVAL, TOKEN_PATH
+from ..config import (
+    FACE_CHECK_INTERVAL, TOKEN_PATH, METRICS_DUMP_PATH, WARMUP_ENABLED, CAMERA_STANDBY,
+    CAMERA_STANDBY_TIMEOUT, PROCESS_IDLE_TIMEOUT
+)
 from ..core.ipc import IPC_PORT, HOST
 
 class SecurityService:
@@ -23,25 +28,36 @@ class SecurityService:
     def __init__(self):
         # Инициализация подсистем
         self.db = DatabaseManager()
-        self.vision = VisionSystem(self.db)
+        # Одна камера - VisionSystem, несколько (FRAME_SOURCES) - CameraGroup
+        self.vision = create_vision(self.db)
         self.system = SystemController()
+        # Санкции к процессам: применяются только смены состояния
+        self.enforcer = EnforcementReconciler(self.system)
         
         self.running = True
         
         # Состояние защиты
         self.global_auth_status = False # Текущий статус доступа (True = можно работать)
         self.last_viewer_heartbeat = 0  # Время последнего сигнала от Редактора
+        self.viewer_files = {}          # file_id -> время последнего сигнала Редактора с этим файлом
         
         # Состояние сессии (для Liveness)
         self.session_active = False     # Есть ли сейчас активная угроза/работа
         self.liveness_passed = False    # Пройден ли тест на живость в текущей сессии
+        self.activation_started = None  # perf_counter начала сессии (до первого решения Liveness)
+        self.idle_since = 0             # Начало покоя с камерой в резерве (0 - камера закрыта)
         
         # Генерация и защита токена доступа (Shared Secret)
         self.auth_token = secrets.token_hex(32)
         self._save_token_encrypted()
         
-        # Кэш черного списка приложений
+        # Кэш черного списка приложений: {id: exe} активных приложений
+        self.apps = {}
+        self.apps_revision = 0  # Ревизия БД (change_log), на которой построен кэш
         self.app_blacklist = []
+        # Права ролей для разбиения галереи: {exe: {роли}}, {file_id: {роли}}
+        self.app_roles = {}
+        self.file_roles = {}
         self._reload_config()
 
     def _save_token_encrypted(self):
@@ -69,19 +85,96 @@ class SecurityService:
 
     def _reload_config(self):
         """Обновляет список запрещенных приложений и кэш лиц из БД."""
-        apps = self.db.get_apps()
-        self.app_blacklist = [a['exe'] for a in apps]
+        self._reload_apps()
+        # Права ролей - маленькие таблицы без журнала, читаются целиком
+        self.app_roles, self.file_roles = self.db.get_role_permissions()
         self.vision.update_cache()
+        # Изменения прочитаны - журнал больше не нужен целиком
+        self.db.prune_change_log()
         print(f"[SERVICE] Конфигурация обновлена. Приложений под защитой: {len(self.app_blacklist)}")
 
+    def _reload_apps(self):
+        """
+        Обновляет кэш приложений. Если есть ревизия и журнал изменений
+        ее покрывает - перечитываются только измененные строки apps.
+        """
+        delta = self.db.get_changes('apps', self.apps_revision) if self.apps_revision else None
+        if delta is None:
+            # Полная загрузка (ревизия - до чтения, см. VisionSystem.update_cache)
+            revision = self.db.get_revision()
+            apps = {a['id']: a['exe'] for a in self.db.get_apps()}
+        else:
+            revision, changes = delta
+            apps = dict(self.apps)
+            for aid in changes:
+                apps.pop(aid, None)
+            changed = [aid for aid, op in changes.items() if op != 'D']
+            for a in self.db.get_apps_by_ids(changed):
+                if a['is_active']:
+                    apps[a['id']] = a['exe']
+
+        self.apps = apps
+        self.apps_revision = revision
+        self.app_blacklist = list(apps.values())
+
+    def _eligible_roles(self, running_exes, active_files):
+        """
+        Роли, допущенные ко всем активным приложениям и файлам (пересечение).
+        Объект без назначенных ролей доступ не ограничивает.
+
+        Returns:
+            frozenset ролей или None (ограничений нет - вся галерея).
+        """
+        allowed = None
+        constraints = [self.app_roles.get(exe) for exe in set(running_exes)]
+        constraints += [self.file_roles.get(fid) for fid in active_files]
+        for roles in constraints:
+            if not roles: continue
+            allowed = set(roles) if allowed is None else allowed & roles
+        return frozenset(allowed) if allowed is not None else None
+
     def start(self):
         """Запуск сервиса."""
         # Запускаем поток обработки команд (IPC)
         ipc_thread = threading.Thread(target=self._ipc_server_loop, daemon=True)
         ipc_thread.start()
+
+        # Модели и пулы загружаются в фоне сейчас, а не при первой проверке;
+        # цикл защиты не ждет прогрева. Пред-детектор привязан к потоку
+        # проверок, поэтому загружается здесь (это быстро)
+        if WARMUP_ENABLED:
+            self.vision.prepare_thread()
+            threading.Thread(target=self._warm_up, name="WarmUp", daemon=True).start()
+        # Камера открывается заранее и ждет активации в резерве
+        if CAMERA_STANDBY:
+            self.vision.standby()
+            self.idle_since = time.time()
         
         # Запускаем основной цикл защиты (в главном потоке)
-        self._security_loop()
+        try:
+            self._security_loop()
+        finally:
+            # Камера и пулы процессов не переживают сервис
+            self.vision.close()
+            self._dump_metrics()
+
+    def _warm_up(self):
+        """Фоновый прогрев моделей и пулов (WARMUP_ENABLED)."""
+        try:
+            self.vision.warm_up()
+        except Exception as e:
+            # Прогрев прерван (например, пулы закрыты по окончании сессии) -
+            # модели догрузятся при первой проверке
+            print(f"[SERVICE] Прогрев не завершен: {e}")
+
+    def _dump_metrics(self):
+        """Сохраняет гистограммы задержек при остановке сервиса."""
+        if not METRICS.enabled: return
+        try:
+            METRICS.dump(METRICS_DUMP_PATH)
+            print(f"[SERVICE] Метрики сохранены: {METRICS_DUMP_PATH}")
+        except Exception as e:
+            print(f"[SERVICE] Не удалось сохранить метрики: {e}")
 
     # =========================================================================
     # IPC SERVER (ОБРАБОТКА КОМАНД)
@@ -132,6 +225,12 @@ class SecurityService:
         if cmd == 'HEARTBEAT':
             # Редактор сообщает, что он жив
             self.last_viewer_heartbeat = time.time()
+            file_id = (req.get('data') or {}).get('file_id')
+            if file_id is not None:
+                self.viewer_files[file_id] = self.last_viewer_heartbeat
+            # Цикл защиты в покое спит до события - будим его сразу
+            if not self.session_active:
+                self.system.wake()
             
             # Отвечаем действием: продолжать работу или закрыться
             if self.global_auth_status:
@@ -141,10 +240,21 @@ class SecurityService:
                 
         elif cmd == 'RELOAD_CONFIG':
             self._reload_config()
+            # Новый черный список - проверить запущенные процессы сразу
+            self.system.wake()
             return {'status': 'ok'}
             
         elif cmd == 'GET_STATUS':
-            return {'status': 'ok', 'authorized': self.global_auth_status}
+            return {
+                'status': 'ok',
+                'authorized': self.global_auth_status,
+                'vision': self.vision.get_stats(),
+                'enforcement': self.enforcer.get_stats()
+            }
+
+        elif cmd == 'GET_METRICS':
+            # Гистограммы задержек этапов (p50/p95/p99, счетчики)
+            return {'status': 'ok', 'metrics': METRICS.snapshot()}
             
         return {'status': 'unknown_command'}
 
@@ -166,12 +276,23 @@ class SecurityService:
             
             try:
                 # 1. Проверка активности (Триггеры)
-                running_pids = []
+                running = {}
                 if self.app_blacklist:
-                    running_pids = self.system.get_running_processes_by_name(self.app_blacklist)
+                    running = self.system.find_running_targets(self.app_blacklist)
+                running_pids = list(running)
+                # Санкции - на все дерево процессов (дочерние окна тоже)
+                protected_pids = self.system.expand_process_trees(running_pids)
                 
                 # Редактор считается активным, если слал пинг менее 2 сек назад
-                viewer_is_active = (time.time() - self.last_viewer_heartbeat) < 2.0
+                now = time.time()
+                viewer_is_active = (now - self.last_viewer_heartbeat) < 2.0
+                active_files = []
+                for fid, ts in list(self.viewer_files.items()):
+                    if now - ts < 2.0:
+                        active_files.append(fid)
+                    else:
+                        # Редактор с этим файлом закрыт - запись больше не нужна
+                        self.viewer_files.pop(fid, None)
                 
                 # Нужна ли защита прямо сейчас?
                 is_active_now = bool(running_pids) or viewer_is_active
@@ -181,22 +302,44 @@ class SecurityService:
                     print("\n[SERVICE] >>> ОБНАРУЖЕНА АКТИВНОСТЬ. СТАРТ ЗАЩИТЫ <<<")
                     self.session_active = True
                     self.liveness_passed = False # Новая сессия требует новой проверки
+                    self.activation_started = time.perf_counter()
+                    self.vision.reset_tracking()
                     
                 if not is_active_now:
+                    # Защищаемых приложений нет - снимаем оставшиеся блокировки
+                    # (дочерние процессы завершившегося приложения и т.п.)
+                    self.enforcer.set_desired([], blocked=False)
+                    self.enforcer.reconcile()
                     # Если активности нет - спим
                     if self.session_active:
-                        print("[SERVICE] Активность завершена. Камера выключена.")
                         self.session_active = False
-                        if self.vision.cap: self.vision.release()
+                        if CAMERA_STANDBY:
+                            print("[SERVICE] Активность завершена. Камера в резерве.")
+                            self.vision.standby()
+                            self.idle_since = now
+                        else:
+                            print("[SERVICE] Активность завершена. Камера выключена.")
+                            self.vision.release()
                         self.global_auth_status = True # Сброс в безопасное состояние
+                    elif (self.idle_since and CAMERA_STANDBY_TIMEOUT
+                          and now - self.idle_since > CAMERA_STANDBY_TIMEOUT):
+                        print("[SERVICE] Долгий покой. Камера выключена.")
+                        self.idle_since = 0
+                        self.vision.release()
                 
                 # --- АКТИВНАЯ ФАЗА ---
                 elif is_active_now:
+                    # Опознаем только сотрудников, чьи роли допущены к активным объектам
+                    self.vision.set_allowed_roles(self._eligible_roles(running.values(), active_files))
                     
                     # ЭТАП A: LIVENESS CHECK (Только один раз в начале)
                     if not self.liveness_passed:
                         print("[SERVICE] Проверка на живость (Anti-Spoofing)...")
                         is_live, msg = self.vision.check_liveness_and_auth()
+                        # Задержка активации: от обнаружения активности до первого решения
+                        if self.activation_started is not None:
+                            METRICS.record('service.activation', time.perf_counter() - self.activation_started)
+                            self.activation_started = None
                         
                         if is_live:
                             print(f"[SERVICE] УСПЕХ: {msg}")
@@ -207,8 +350,8 @@ class SecurityService:
                             print(f"[SERVICE] ОТКАЗ: {msg}")
                             self.global_auth_status = False
                             # Мгновенная блокировка приложений
-                            if running_pids:
-                                for pid in running_pids: self.system.block_process_window(pid)
+                            self.enforcer.set_desired(protected_pids, blocked=True)
+                            self.enforcer.reconcile()
                             
                             # Пропускаем остаток цикла, пока не пройдем Liveness
                             continue 
@@ -216,7 +359,10 @@ class SecurityService:
                     # ЭТАП B: ОБЫЧНЫЙ МОНИТОРИНГ (Быстрый)
                     face_ok = self.vision.check_authorization()
                     
-                    if face_ok:
+                    if face_ok is None:
+                        # Кадры непригодны (темнота, смаз) - не промах, статус не меняется
+                        pass
+                    elif face_ok:
                         # Все хорошо, лицо на месте
                         if consecutive_misses > 0:
                             pass # print("Лицо вернулось")
@@ -235,22 +381,25 @@ class SecurityService:
                             # Если потеряли надолго - сбрасываем Liveness.
                             # При возвращении придется снова доказывать, что ты живой.
                             self.liveness_passed = False 
+                            self.vision.reset_tracking()
 
                     # ЭТАП C: ПРИМЕНЕНИЕ САНКЦИЙ К ПРИЛОЖЕНИЯМ
                     # (Редактор сам запросит статус через Heartbeat и закроется если False)
-                    if running_pids:
-                        if self.global_auth_status:
-                            for pid in running_pids: self.system.unblock_process_window(pid)
-                        else:
-                            for pid in running_pids: self.system.block_process_window(pid)
+                    self.enforcer.set_desired(protected_pids, blocked=not self.global_auth_status)
+                    self.enforcer.reconcile()
 
             except Exception as e:
                 print(f"[LOOP ERROR] {e}")
             
-            # Умная задержка
-            elapsed = time.time() - start_time
-            sleep_time = max(0.1, FACE_CHECK_INTERVAL - elapsed)
-            time.sleep(sleep_time)
+            # Умная задержка: в сессии - до следующего такта, в покое - до
+            # запуска приложения из черного списка или сигнала Редактора.
+            # Событие о новом процессе прерывает ожидание в обоих случаях.
+            if self.session_active:
+                elapsed = time.time() - start_time
+                sleep_time = max(0.1, FACE_CHECK_INTERVAL - elapsed)
+            else:
+                sleep_time = PROCESS_IDLE_TIMEOUT
+            self.system.wait_for_process_event(self.app_blacklist, sleep_time)
 
 if __name__ == "__main__":
     # Проверка прав администратора при запуске
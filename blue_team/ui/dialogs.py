@@ -1,4 +1,5 @@
 import os
+import cv2
 import face_recognition
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtWidgets import (
@@ -8,6 +9,9 @@ from PyQt5.QtWidgets import (
     QTabWidget, QWidget, QMessageBox, QProgressBar, QHBoxLayout
 )
 
+from ..core.gallery import prune_templates
+from ..core.sources import create_frame_source
+
 # =========================================================================
 # ДИАЛОГ СОЗДАНИЯ РОЛИ
 # =========================================================================
@@ -166,6 +170,43 @@ class AddAppDialog(QDialog):
             return
         super().accept()
 
+# =========================================================================
+# СЪЕМКА ЭТАЛОНОВ С КАМЕРЫ (ФОНОВЫЙ ПОТОК)
+# =========================================================================
+class CameraCaptureThread(QtCore.QThread):
+    """Серия снимков с камеры вне UI-потока. Берутся только кадры ровно с одним лицом."""
+
+    progress = QtCore.pyqtSignal(int, int)  # (номер снимка, всего)
+    captured = QtCore.pyqtSignal(list)      # Векторы лиц удачных снимков
+    failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, shots, interval, parent=None):
+        super().__init__(parent)
+        self.shots = shots
+        self.interval = interval
+
+    def run(self):
+        source = create_frame_source()
+        if not source.open():
+            source.release()
+            self.failed.emit("Камера недоступна.")
+            return
+        encodings = []
+        try:
+            for i in range(self.shots):
+                if self.isInterruptionRequested(): break
+                self.progress.emit(i + 1, self.shots)
+                ret, frame = source.read()
+                if not ret: break
+                encs = face_recognition.face_encodings(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                if len(encs) == 1:
+                    encodings.append(encs[0])
+                if i < self.shots - 1:
+                    self.msleep(int(self.interval * 1000))
+        finally:
+            source.release()
+        self.captured.emit(encodings)
+
 # =========================================================================
 # ДИАЛОГ ДОБАВЛЕНИЯ СОТРУДНИКА (ОДИНОЧНЫЙ / МАССОВЫЙ)
 # =========================================================================
@@ -202,9 +243,16 @@ class AddUserDialog(QDialog):
         form.addRow("Роль:", self.role_combo)
         layout.addLayout(form)
         
+        # Несколько снимков (освещение, очки) - несколько эталонов сотрудника
+        btns = QHBoxLayout()
         self.btn_photo = QPushButton("Загрузить фото лица...")
         self.btn_photo.clicked.connect(self.get_photo)
-        layout.addWidget(self.btn_photo)
+        btns.addWidget(self.btn_photo)
+        self.btn_camera = QPushButton("Снять с камеры")
+        # lambda: clicked передает checked, который занял бы параметр shots
+        self.btn_camera.clicked.connect(lambda: self.capture_from_camera())
+        btns.addWidget(self.btn_camera)
+        layout.addLayout(btns)
         
         self.lbl_status = QLabel("Фото не выбрано")
         self.lbl_status.setAlignment(QtCore.Qt.AlignCenter)
@@ -217,12 +265,13 @@ class AddUserDialog(QDialog):
         self.btn_save.clicked.connect(self.save_single)
         layout.addWidget(self.btn_save)
         
-        self.face_encoding = None
+        self.face_encodings = []
+        self._capture_thread = None
 
     def _setup_bulk_tab(self):
         layout = QVBoxLayout(self.tab_bulk)
         
-        info = QLabel("Формат файла (CSV/TXT):\nИмя Фамилия;Роль;Путь_к_файлу_фото.jpg")
+        info = QLabel("Формат файла (CSV/TXT):\nИмя Фамилия;Роль;Путь_к_файлу_фото.jpg[;Еще_фото.jpg...]")
         info.setStyleSheet("background: #f0f0f0; padding: 10px; border: 1px solid #ddd;")
         layout.addWidget(info)
         
@@ -239,37 +288,79 @@ class AddUserDialog(QDialog):
         layout.addWidget(self.progress)
 
     def get_photo(self):
-        path, _ = QFileDialog.getOpenFileName(self, "Выбор фото", filter="Images (*.jpg *.png *.jpeg)")
-        if path:
+        paths, _ = QFileDialog.getOpenFileNames(self, "Выбор фото", filter="Images (*.jpg *.png *.jpeg)")
+        if paths:
             self.lbl_status.setText("Обработка...")
             QtWidgets.qApp.processEvents()
-            try:
-                img = face_recognition.load_image_file(path)
-                encs = face_recognition.face_encodings(img)
-                if encs:
-                    self.face_encoding = encs[0]
-                    self.lbl_status.setText("Фото успешно обработано")
-                    self.lbl_status.setStyleSheet("color: green;")
-                else:
-                    self.face_encoding = None
-                    self.lbl_status.setText("Лицо не найдено на фото")
-                    self.lbl_status.setStyleSheet("color: red;")
-            except Exception as e:
-                self.lbl_status.setText("Ошибка чтения файла")
-                self.lbl_status.setStyleSheet("color: red;")
+            errors = 0
+            for path in paths:
+                try:
+                    img = face_recognition.load_image_file(path)
+                    encs = face_recognition.face_encodings(img)
+                    if encs:
+                        self.face_encodings.append(encs[0])
+                except Exception:
+                    errors += 1
+            self._update_photo_status(errors)
+
+    def capture_from_camera(self, shots=5, interval=0.4):
+        """Серия снимков с камеры в фоновом потоке (окно не замирает)."""
+        if self._capture_thread is not None: return
+        self.btn_camera.setEnabled(False)
+        self.btn_save.setEnabled(False)
+
+        thread = CameraCaptureThread(shots, interval, self)
+        thread.progress.connect(lambda i, n: self.lbl_status.setText(f"Съемка {i}/{n}..."))
+        thread.captured.connect(self._on_camera_captured)
+        thread.failed.connect(lambda msg: QMessageBox.warning(self, "Ошибка", msg))
+        thread.finished.connect(self._on_capture_finished)
+        self._capture_thread = thread
+        thread.start()
+
+    def _on_camera_captured(self, encodings):
+        self.face_encodings.extend(encodings)
+        self._update_photo_status()
+
+    def _on_capture_finished(self):
+        self._capture_thread = None
+        self.btn_camera.setEnabled(True)
+        self.btn_save.setEnabled(True)
+
+    def done(self, result):
+        # Диалог закрывается во время съемки - дожидаемся потока (он владеет камерой)
+        if self._capture_thread is not None:
+            self._capture_thread.requestInterruption()
+            self._capture_thread.wait()
+        super().done(result)
+
+    def _update_photo_status(self, errors=0):
+        templates = prune_templates(self.face_encodings)
+        if len(templates):
+            self.lbl_status.setText(
+                f"Эталонов: {len(templates)} (снимков с лицом: {len(self.face_encodings)}, "
+                f"дубликаты отброшены)"
+            )
+            self.lbl_status.setStyleSheet("color: green;")
+        elif errors:
+            self.lbl_status.setText("Ошибка чтения файла")
+            self.lbl_status.setStyleSheet("color: red;")
+        else:
+            self.lbl_status.setText("Лицо не найдено на фото")
+            self.lbl_status.setStyleSheet("color: red;")
 
     def save_single(self):
         if not self.name_input.text():
             QMessageBox.warning(self, "Ошибка", "Введите ФИО.")
             return
-        if self.face_encoding is None:
+        if not self.face_encodings:
             QMessageBox.warning(self, "Ошибка", "Необходимо загрузить фото лица.")
             return
             
+        # Эталоны без почти-дубликатов (не больше TEMPLATE_MAX_PER_USER)
         self.single_user_data = (
             self.name_input.text(),
             self.role_combo.currentText(),
-            self.face_encoding
+            prune_templates(self.face_encodings)
         )
         self.accept()
 
@@ -295,14 +386,19 @@ class AddUserDialog(QDialog):
                 if len(parts) >= 3:
                     name = parts[0].strip()
                     role = parts[1].strip()
-                    img_path = parts[2].strip()
+                    img_paths = [p.strip() for p in parts[2:] if p.strip()]
                     
-                    if os.path.exists(img_path):
-                        img = face_recognition.load_image_file(img_path)
-                        encs = face_recognition.face_encodings(img)
-                        if encs:
-                            self.bulk_users_data.append((name, role, encs[0]))
-                            self.log_list.addItem(f"OK: {name}")
+                    if any(os.path.exists(p) for p in img_paths):
+                        found = []
+                        for img_path in img_paths:
+                            if not os.path.exists(img_path): continue
+                            img = face_recognition.load_image_file(img_path)
+                            encs = face_recognition.face_encodings(img)
+                            if encs: found.append(encs[0])
+                        if found:
+                            templates = prune_templates(found)
+                            self.bulk_users_data.append((name, role, templates))
+                            self.log_list.addItem(f"OK: {name} (эталонов: {len(templates)})")
                         else:
                             self.log_list.addItem(f"Ошибка (Лицо не найдено): {name}")
                     else:
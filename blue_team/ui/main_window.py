@@ -277,7 +277,8 @@ class ConfiguratorWindow(QMainWindow):
                 self.db.add_user(*dlg.single_user_data)
                 self._log(f"Сотрудник добавлен: {dlg.single_user_data[0]}")
             elif dlg.bulk_users_data: 
-                for u in dlg.bulk_users_data: self.db.add_user(*u)
+                # Одной пачкой: снимок галереи пересчитывается один раз
+                self.db.add_users(dlg.bulk_users_data)
                 self._log("Массовый импорт сотрудников завершен.")
             self.load_data()
             self.ipc.reload_config()
@@ -44,7 +44,7 @@ def main():
     # При каждом запуске проверяем и обновляем ассоциации файлов .enc
     # Это гарантирует, что двойной клик будет работать
     print("[INIT] Настройка файловых ассоциаций...")
-    sys_ctrl = SystemController()
+    sys_ctrl = SystemController(watch_processes=False)
     sys_ctrl.register_file_association()
     
     # --- ЗАПУСК ОКНА ---